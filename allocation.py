@@ -0,0 +1,106 @@
+# Adaptive allocation of a fixed run budget across temperatures.
+# Every temperature first gets a few pilot runs; each further run goes to the temperature
+# whose outputs still look the least explored, measured by the Good-Turing estimate of the
+# chance that the next sample is an output not seen yet (runs whose normalized output
+# occurred exactly once, over all runs). Temperatures that have collapsed onto a handful of
+# outputs stop drawing runs, so the budget is spent where new samples still add information.
+import threading
+from collections import Counter
+
+from candidates import normalize_candidate
+
+
+class AdaptiveAllocator:
+    def __init__(self, keys, budget, initial=3, max_per_key=31):
+        self.keys = list(keys)
+        self.budget = budget
+        self.initial = initial
+        self.max_per_key = max_per_key
+        self._lock = threading.Lock()
+        self._counts = {k: Counter() for k in self.keys}
+        self._runs = {k: set() for k in self.keys}
+        self._pending = {k: set() for k in self.keys}
+        self.sequence = []
+
+    def seed(self, key, run, text):
+        # A run finished before the allocator existed (e.g. from a resumed log); it counts
+        # against the budget like any other run
+        with self._lock:
+            self._add(key, run, text)
+
+    def _add(self, key, run, text):
+        self._pending[key].discard(run)
+        if run not in self._runs[key]:
+            self._runs[key].add(run)
+            self._counts[key][normalize_candidate(text)] += 1
+
+    def spent(self):
+        return sum(len(r) + len(p) for r, p in zip(self._runs.values(), self._pending.values()))
+
+    def new_output_rate(self, key, extra=0):
+        # Smoothed missing-mass estimate; `extra` counts runs already handed out but not back
+        n = sum(self._counts[key].values())
+        singletons = sum(1 for c in self._counts[key].values() if c == 1)
+        return (singletons + 1) / (n + extra + 2)
+
+    def _next_run(self, key):
+        # Lowest run number not finished or in flight, so gaps left by a crash are refilled
+        taken = self._runs[key] | self._pending[key]
+        run = 1
+        while run in taken:
+            run += 1
+        return run
+
+    def next_batch(self, size):
+        # Up to `size` (key, run) assignments; [] once the budget or every key is exhausted
+        batch = []
+        with self._lock:
+            while len(batch) < size and self.spent() < self.budget:
+                open_keys = [k for k in self.keys
+                             if len(self._runs[k]) + len(self._pending[k]) < self.max_per_key]
+                if not open_keys:
+                    break
+                pilot = [k for k in open_keys if len(self._runs[k]) + len(self._pending[k]) < self.initial]
+                if pilot:
+                    key = min(pilot, key=lambda k: len(self._runs[k]) + len(self._pending[k]))
+                else:
+                    key = max(open_keys, key=lambda k: self.new_output_rate(k, len(self._pending[k])))
+                run = self._next_run(key)
+                self._pending[key].add(run)
+                self.sequence.append(key)
+                batch.append((key, run))
+        return batch
+
+    def record(self, key, run, text):
+        with self._lock:
+            self._add(key, run, text)
+
+    def key_summary(self, key):
+        with self._lock:
+            counts = self._counts[key]
+            return {
+                'runs': len(self._runs[key]),
+                'unique': len(counts),
+                'singletons': sum(1 for c in counts.values() if c == 1),
+                'new_output_rate': round(self.new_output_rate(key), 4)
+            }
+
+    def summary(self):
+        # How the budget was spent, for the results JSON
+        per_key = [{'temperature': k, **self.key_summary(k)} for k in self.keys]
+        with self._lock:
+            return {
+                'budget': self.budget,
+                'spent': self.spent(),
+                'initial': self.initial,
+                'max_per_temperature': self.max_per_key,
+                'per_temperature': per_key,
+                'sequence': list(self.sequence)
+            }
+
+    def print(self):
+        s = self.summary()
+        print(f"[ALLOC] {s['spent']}/{s['budget']} runs spent")
+        for t in s['per_temperature']:
+            print(f"[ALLOC] T={t['temperature']}: {t['runs']} runs, {t['unique']} unique outputs, "
+                  f"new-output rate {t['new_output_rate']:.2f}")
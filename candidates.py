@@ -0,0 +1,75 @@
+# Helpers for collapsing identical candidate translations so each distinct output is
+# backtranslated and embedded once, then fanned back out to every run that produced it.
+import re
+import threading
+import unicodedata
+from concurrent.futures import Future
+
+
+def normalize_candidate(text):
+    # NFKC (full/half-width forms), collapsed whitespace; the key used to detect duplicates
+    if not text:
+        return ''
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFKC', text)).strip()
+
+
+def group_candidates(texts):
+    # [{'key', 'indices', 'multiplicity'}, ...] in first-seen order; indices point into texts
+    groups = {}
+    for i, t in enumerate(texts):
+        key = normalize_candidate(t)
+        g = groups.get(key)
+        if g is None:
+            g = groups[key] = {'key': key, 'indices': []}
+        g['indices'].append(i)
+    out = list(groups.values())
+    for g in out:
+        g['multiplicity'] = len(g['indices'])
+    return out
+
+
+def expand_group_scores(groups, group_sims, k=None):
+    # group_sims is [(group_idx, sim), ...] best first; returns [(item_idx, sim), ...] best first
+    # with every duplicate inheriting its group's score, so a candidate produced n times
+    # still fills n slots of a top-k selection
+    out = []
+    for g_idx, sim in group_sims:
+        for i in groups[g_idx]['indices']:
+            out.append((i, sim))
+            if k is not None and len(out) >= k:
+                return out
+    return out
+
+
+class CallOnce:
+    # Thread-safe memo: the first caller for a key runs fn, concurrent and later callers
+    # for the same key wait for and share that result
+    def __init__(self, fn):
+        self._fn = fn
+        self._lock = threading.Lock()
+        self._futures = {}
+        self.calls = 0
+        self.reused = 0
+
+    def prime(self, key, value):
+        # Seed a known result (e.g. from a resumed checkpoint) without calling fn
+        with self._lock:
+            if key not in self._futures:
+                fut = self._futures[key] = Future()
+                fut.set_result(value)
+
+    def __call__(self, key, *args, **kwargs):
+        with self._lock:
+            fut = self._futures.get(key)
+            owner = fut is None
+            if owner:
+                fut = self._futures[key] = Future()
+                self.calls += 1
+            else:
+                self.reused += 1
+        if owner:
+            try:
+                fut.set_result(self._fn(*args, **kwargs))
+            except Exception as e:
+                fut.set_exception(e)
+        return fut.result()
@@ -0,0 +1,135 @@
+# Streaming batch translation over a corpus file.
+# Inputs (.txt one sentence per line, .csv, .json array, .jsonl) are read lazily one record
+# at a time, a bounded window of sentences is translated concurrently, and each finished
+# sentence is appended to a JSONL output (result_log.ResultLog) in input order. Memory stays
+# proportional to the window, not to the corpus.
+import csv
+import json
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from result_log import ResultLog
+
+TEXT_FIELDS = ('text', 'input_text', 'english', 'sentence', 'source')
+DEFAULT_BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", "4"))
+
+
+def _record_text(record, text_field=None):
+    # A JSON/CSV record is either a bare string or an object with a text field
+    if isinstance(record, str):
+        return record
+    if isinstance(record, dict):
+        if text_field:
+            return record.get(text_field)
+        for field in TEXT_FIELDS:
+            if isinstance(record.get(field), str):
+                return record[field]
+    return None
+
+
+def _iter_json_array(f, chunk_size=65536):
+    # Yields the elements of a top-level JSON array without loading the whole document
+    decoder = json.JSONDecoder()
+    buf = ''
+    started = False
+    eof = False
+    while True:
+        buf = buf.lstrip()
+        if not started:
+            if not buf.startswith('['):
+                if buf or eof:
+                    raise ValueError("Expected a JSON array at the top level")
+            else:
+                buf = buf[1:]
+                started = True
+                continue
+        else:
+            if buf.startswith(']'):
+                return
+            if buf.startswith(','):
+                buf = buf[1:]
+                continue
+            if buf:
+                try:
+                    item, end = decoder.raw_decode(buf)
+                except json.JSONDecodeError:
+                    # Element spans the chunk boundary; read more unless the file is done
+                    if eof:
+                        raise
+                else:
+                    # A number at the end of the buffer may continue in the next chunk
+                    if end < len(buf) or eof:
+                        yield item
+                        buf = buf[end:]
+                        continue
+            elif eof:
+                raise ValueError("Unterminated JSON array")
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+        buf += chunk
+
+
+def iter_corpus(path, text_field=None):
+    # (line/record number, text) for every non-empty sentence, read lazily
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, 'r', encoding='utf-8', newline='' if ext == '.csv' else None) as f:
+        if ext == '.csv':
+            reader = csv.DictReader(f)
+            field = text_field
+            if field is None:
+                names = reader.fieldnames or []
+                field = next((n for n in names if n.strip().lower() in TEXT_FIELDS), names[0] if names else None)
+            records = ((n, row.get(field)) for n, row in enumerate(reader, 1))
+        elif ext == '.jsonl':
+            records = ((n, _record_text(json.loads(line), text_field)) for n, line in enumerate(f, 1) if line.strip())
+        elif ext == '.json':
+            records = ((n, _record_text(item, text_field)) for n, item in enumerate(_iter_json_array(f), 1))
+        else:
+            records = enumerate(f, 1)
+        for n, text in records:
+            text = text.strip() if isinstance(text, str) else ''
+            if text:
+                yield n, text
+
+
+def stream_translations(items, translate, output_path, header=None, workers=DEFAULT_BATCH_WORKERS, window=None):
+    # translate(text) -> JSON-serializable result, called on `workers` threads with at most
+    # `window` sentences in flight. Each (n, text) item becomes one output line
+    # {'type': 'result', 'n', 'input_text', 'result'} (or 'error'), written in input order.
+    # Returns (sentences written, errors).
+    workers = max(1, workers)
+    window = max(workers, window or 2 * workers)
+    log = ResultLog(output_path, header=header)
+    in_flight = deque()
+    counts = {'written': 0, 'errors': 0}
+
+    def write(n, text, future):
+        record = {'type': 'result', 'n': n, 'input_text': text}
+        try:
+            record['result'] = future.result()
+        except Exception as e:
+            print(f"[ERROR] Sentence {n} failed: {e}")
+            record['type'] = 'error'
+            record['error'] = str(e)
+            counts['errors'] += 1
+        log.append(record)
+        counts['written'] += 1
+        if counts['written'] % 100 == 0:
+            print(f"[BATCH] {counts['written']} sentences written ({counts['errors']} errors)")
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for n, text in items:
+                in_flight.append((n, text, pool.submit(translate, text)))
+                # Block on the oldest sentence once the window is full, so reading the input
+                # never runs ahead of the model by more than `window` sentences
+                while len(in_flight) >= window:
+                    write(*in_flight.popleft())
+            while in_flight:
+                write(*in_flight.popleft())
+    finally:
+        log.close()
+    print(f"[BATCH] Done: {counts['written']} sentences written to {output_path} ({counts['errors']} errors)")
+    return counts['written'], counts['errors']
@@ -1,6 +1,10 @@
 import json
+import os
 import sys
-from hf_models import load_qwen3_reranker
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'onebatch'))
+from ollama_setup import load_qwen3_reranker
+from rerank import rerank
 
 # Usage: python aggregate_distributed_results.py batch_translations.json
 if len(sys.argv) < 2:
@@ -24,21 +28,12 @@ text = valid_results[0].get('input_text', '')
 back_english_list = [r.get('backtranslation', '') or r.get('back_english', '') for r in valid_results]
 reranker = load_qwen3_reranker()
 embs = reranker([text] + back_english_list)
-import numpy as np
 if not embs or len(embs[0]) == 0:
     print("[ERROR] Query embedding is empty for reranking. Skipping reranking and fusion.")
     sys.exit(1)
-q_emb = np.array(embs[0])
-sims = []
-for i, e in enumerate(embs[1:]):
-    if e and len(e) == len(q_emb):
-        d = np.array(e)
-        sim = float(np.dot(q_emb, d) / (np.linalg.norm(q_emb) * np.linalg.norm(d) + 1e-8))
-        sims.append((i, sim))
-    else:
-        print(f"[WARN] Skipping doc {i} due to empty or mismatched embedding.")
+# Vectorized cosine scores; only the 14 best are needed for fusion
+sims = rerank(embs[0], embs[1:], k=14)
 scored = [(sim, valid_results[idx]) for idx, sim in sims]
-scored.sort(reverse=True, key=lambda x: x[0])
 
 # Top 3 and 4th-14th for fusion
 fuse_top3 = [r['japanese'] for _, r in scored[:3]]
@@ -50,23 +45,23 @@ model_name = valid_results[0].get('model', 'qwen2.5:7b-instruct')
 fuse_prompt_top3 = """Fuse these Japanese sentences into one natural, fluent Japanese translation that preserves all the original meaning, is not overly formal, and is suitable for a general audience. Only output the Japanese translation, no commentary.\n\n"""
 for idx, jp in enumerate(fuse_top3):
     fuse_prompt_top3 += f"{idx+1}. {jp}\n"
-fused_top3 = call_ollama_generation(fuse_prompt_top3, model_name)
+fused_top3 = call_ollama_generation(fuse_prompt_top3, model_name, stage='fuse', source=fuse_top3)
 fused_top3 = parse_translation_output(fused_top3)['japanese']
 
 # LLM Fusion of 4th-14th
 fuse_prompt_4_14 = """Fuse these Japanese sentences into one natural, fluent Japanese translation that preserves all the original meaning, is not overly formal, and is suitable for a general audience. Only output the Japanese translation, no commentary.\n\n"""
 for idx, jp in enumerate(fuse_4_14):
     fuse_prompt_4_14 += f"{idx+4}. {jp}\n"
-fused_4_14 = call_ollama_generation(fuse_prompt_4_14, model_name)
+fused_4_14 = call_ollama_generation(fuse_prompt_4_14, model_name, stage='fuse', source=fuse_4_14)
 fused_4_14 = parse_translation_output(fused_4_14)['japanese']
 
 # Final LLM Fusion of the two fusions
 final_fuse_prompt = """Fuse these two Japanese translations into one final, natural, fluent Japanese translation that preserves all the original meaning, is not overly formal, and is suitable for a general audience. Only output the Japanese translation, no commentary.\n\n1. """ + fused_top3 + "\n2. " + fused_4_14 + "\n"
-final_fused_japanese = call_ollama_generation(final_fuse_prompt, model_name)
+final_fused_japanese = call_ollama_generation(final_fuse_prompt, model_name, stage='fuse', source=[fused_top3, fused_4_14])
 final_fused_japanese = parse_translation_output(final_fused_japanese)['japanese']
 
 # Backtranslate the final fused Japanese to English using the LLM
-final_fused_back_en = call_ollama_generation(f"Translate this to English. Only output the English translation, no commentary or explanation:\n\n{final_fused_japanese}", model_name)
+final_fused_back_en = call_ollama_generation(f"Translate this to English. Only output the English translation, no commentary or explanation:\n\n{final_fused_japanese}", model_name, stage='backtranslate', source=final_fused_japanese)
 final_fused_back_en = parse_backtranslation_output(final_fused_back_en)['english']
 
 # Build histogram
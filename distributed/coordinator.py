@@ -0,0 +1,152 @@
+# Coordinator for distributed translation jobs: serves the endpoints that
+# start_distributed_job.py, distributed.py and worker.py talk to, backed by the in-memory
+# leased WorkQueue (see work_queue.py).
+#   POST /start-distributed    {text, model, runs} -> {job_id, runs, completed, done}; `text` is the bare
+#                              English source, workers add the translation instruction
+#   GET  /get-work             ?wait= -> a leased task {work_id, job_id, text, model, run, lease_timeout}, or
+#                              204 when none arrives within `wait` seconds (long poll, capped at --max_wait)
+#                              ?max_tasks=N leases up to N tasks at once -> {tasks: [...]}, or 204
+#   POST /submit-translation   {work_id, result} -> {status: ok|duplicate}, 404 for an unknown work_id
+#   POST /submit-translations  {results: [{work_id, result}, ...]} -> {statuses: {work_id: ok|duplicate|unknown}}
+#   GET  /distributed-results  ?job_id= (default: latest job) -> {job_id, runs, completed, done, cursor, results}
+#   GET  /jobs/<job_id>/results ?since=K&wait=S -> the same, with only the results after the first K;
+#                              blocks up to S seconds for a new one (404 for an unknown job)
+#   GET  /jobs/<job_id>/wait   ?timeout=S -> {job_id, runs, completed, done, cursor} once the job is done
+#                              or S seconds have passed
+# Finished jobs are kept for --job_ttl seconds, after which their endpoints return 404.
+# Usage: python coordinator.py --port 5000 --lease_timeout 600
+import argparse
+
+from flask import Flask, jsonify, request
+
+from work_queue import WorkQueue
+
+app = Flask(__name__)
+queue = WorkQueue()
+max_wait = 30.0
+
+
+def _wait_arg(name):
+    # Non-negative float query argument, capped at --max_wait; raises ValueError
+    return min(max(float(request.args.get(name, 0)), 0.0), max_wait)
+
+
+@app.route('/start-distributed', methods=['POST'])
+def start_distributed():
+    data = request.get_json(silent=True) or {}
+    text = data.get('text')
+    if not text:
+        return jsonify({'error': "'text' is required"}), 400
+    try:
+        runs = int(data.get('runs', 31))
+    except (TypeError, ValueError):
+        return jsonify({'error': "'runs' must be an integer"}), 400
+    if runs < 1:
+        return jsonify({'error': "'runs' must be at least 1"}), 400
+    job = queue.start_job(text, data.get('model', 'qwen2.5:7b-instruct'), runs)
+    print(f"[COORDINATOR] Job {job['job_id']}: {runs} tasks queued")
+    return jsonify(job)
+
+
+@app.route('/get-work', methods=['GET'])
+def get_work():
+    try:
+        wait = _wait_arg('wait')
+    except ValueError:
+        return jsonify({'error': "'wait' must be a number"}), 400
+    if 'max_tasks' not in request.args:
+        task = queue.lease(wait)
+        if task is None:
+            return '', 204
+        return jsonify(task)
+    try:
+        max_tasks = int(request.args['max_tasks'])
+    except ValueError:
+        return jsonify({'error': "'max_tasks' must be an integer"}), 400
+    if max_tasks < 1:
+        return jsonify({'error': "'max_tasks' must be at least 1"}), 400
+    tasks = queue.lease_many(max_tasks, wait)
+    if not tasks:
+        return '', 204
+    return jsonify({'tasks': tasks})
+
+
+@app.route('/submit-translation', methods=['POST'])
+def submit_translation():
+    data = request.get_json(silent=True) or {}
+    work_id = data.get('work_id')
+    if not work_id:
+        return jsonify({'error': "'work_id' is required"}), 400
+    status = queue.submit(work_id, data.get('result'))
+    if status == 'unknown':
+        return jsonify({'error': f"Unknown work_id {work_id}"}), 404
+    return jsonify({'status': status})
+
+
+@app.route('/submit-translations', methods=['POST'])
+def submit_translations():
+    data = request.get_json(silent=True) or {}
+    items = data.get('results')
+    if not isinstance(items, list) or not all(isinstance(i, dict) and i.get('work_id') for i in items):
+        return jsonify({'error': "'results' must be a list of {work_id, result}"}), 400
+    statuses = queue.submit_many([(i['work_id'], i.get('result')) for i in items])
+    return jsonify({'statuses': statuses})
+
+
+@app.route('/distributed-results', methods=['GET'])
+def distributed_results():
+    summary, results = queue.results(request.args.get('job_id'))
+    if summary is None:
+        return jsonify({'results': [], 'completed': 0, 'runs': 0, 'done': False, 'cursor': 0})
+    return jsonify({**summary, 'results': results})
+
+
+@app.route('/jobs/<job_id>/results', methods=['GET'])
+def job_results(job_id):
+    try:
+        since = max(int(request.args.get('since', 0)), 0)
+        wait = _wait_arg('wait')
+    except ValueError:
+        return jsonify({'error': "'since' must be an integer and 'wait' a number"}), 400
+    summary, results = queue.results(job_id, since, wait)
+    if summary is None:
+        return jsonify({'error': f"Unknown job {job_id}"}), 404
+    return jsonify({**summary, 'results': results})
+
+
+@app.route('/jobs/<job_id>/wait', methods=['GET'])
+def wait_for_job(job_id):
+    try:
+        timeout = _wait_arg('timeout')
+    except ValueError:
+        return jsonify({'error': "'timeout' must be a number"}), 400
+    summary = queue.wait_for_job(job_id, timeout)
+    if summary is None:
+        return jsonify({'error': f"Unknown job {job_id}"}), 404
+    return jsonify(summary)
+
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    return jsonify(queue.get_stats())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Coordinator for distributed translation workers')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--lease_timeout', type=float, default=600.0, help='Seconds a worker holds a task before it is requeued')
+    parser.add_argument('--max_attempts', type=int, default=3, help='Expired leases before a task is recorded as failed')
+    parser.add_argument('--job_ttl', type=float, default=3600.0, help='Seconds a finished job and its results are kept')
+    parser.add_argument('--max_wait', type=float, default=30.0, help='Longest a /get-work or results long poll may block (seconds)')
+    args = parser.parse_args()
+    global max_wait
+    max_wait = args.max_wait
+    queue.lease_timeout = args.lease_timeout
+    queue.max_attempts = args.max_attempts
+    queue.job_ttl = args.job_ttl
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -13,51 +13,53 @@ parser.add_argument('--timeout', type=int, default=600, help='Timeout in seconds
 parser.add_argument('--text', required=True, help='English text to translate (2 sentences recommended)')
 args = parser.parse_args()
 
-# Prepend starter instruction
-starter = "Translate this English text into Japanese in a polite, friendly manner, but not over the top.\n\n"
-full_text = starter + args.text.strip()
-
-# 1. Enqueue jobs
-payload = {'text': full_text, 'model': args.model, 'runs': args.runs}
+# 1. Enqueue jobs; the job carries the bare English text, workers wrap it in the translate prompt
+payload = {'text': args.text.strip(), 'model': args.model, 'runs': args.runs}
 resp = requests.post(f'{args.server}/start-distributed', json=payload)
 if resp.status_code != 200:
     print('[ERROR] Failed to enqueue jobs:', resp.text)
     sys.exit(1)
-print(f'[INFO] Enqueued {args.runs} jobs for distributed translation.')
+job_id = resp.json()['job_id']
+print(f'[INFO] Enqueued {args.runs} jobs for distributed translation (job {job_id}).')
+
 
+# 2. Long-poll for new results; the cursor means each result is downloaded once
+def result_key(res):
+    # Try to get work_id from metadata or top-level
+    work_id = res.get('work_id')
+    if not work_id and 'metadata' in res:
+        work_id = res['metadata'].get('work_id')
+    if not work_id and 'metadata' in res and 'run' in res['metadata']:
+        # fallback: use run as pseudo-id if work_id missing
+        work_id = res['metadata']['run']
+    return work_id
 
-# 2. Poll for results (ensure unique work_ids)
 start = time.time()
+cursor = 0
+unique_results = {}
 while True:
-    r = requests.get(f'{args.server}/distributed-results')
+    remaining = args.timeout - (time.time() - start)
+    if remaining <= 0:
+        print('[ERROR] Timeout waiting for results.')
+        sys.exit(1)
+    wait = min(remaining, 30)
+    r = requests.get(f'{args.server}/jobs/{job_id}/results', params={'since': cursor, 'wait': wait}, timeout=wait + 30)
     if r.status_code != 200:
         print('[ERROR] Failed to get results:', r.text)
         sys.exit(1)
     data = r.json()
-    results = data.get('results', [])
+    cursor = data['cursor']
     # Only count unique work_ids
-    unique_results = {}
-    for res in results:
-        work_id = None
-        # Try to get work_id from metadata or top-level
+    for res in data['results']:
         if isinstance(res, dict):
-            work_id = res.get('work_id')
-            if not work_id and 'metadata' in res:
-                work_id = res['metadata'].get('work_id')
-            if not work_id and 'metadata' in res and 'run' in res['metadata']:
-                # fallback: use run as pseudo-id if work_id missing
-                work_id = res['metadata']['run']
-        if work_id is not None:
-            unique_results[work_id] = res
-    if len(unique_results) >= args.runs:
+            work_id = result_key(res)
+            if work_id is not None:
+                unique_results[work_id] = res
+    if data['done'] or len(unique_results) >= args.runs:
         print(f'[INFO] All {args.runs} unique results collected.')
         results = list(unique_results.values())
         break
     print(f'[INFO] {len(unique_results)}/{args.runs} unique results ready. Waiting...')
-    if time.time() - start > args.timeout:
-        print('[ERROR] Timeout waiting for results.')
-        sys.exit(1)
-    time.sleep(1)
 
 
 # 3. Save results to distributed_aggregate.json (for direct aggregation)
@@ -67,8 +69,10 @@ print('[INFO] Saved all results to distributed_aggregate.json')
 
 
 # 4. Directly aggregate results in Python (incorporated logic from aggregate_distributed_results.py)
-from hf_models import load_qwen3_reranker
-import numpy as np
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'onebatch'))
+from ollama_setup import load_qwen3_reranker
+from rerank import rerank
 from cli_gen_prime import call_ollama_generation, parse_translation_output, parse_backtranslation_output
 from collections import Counter
 
@@ -86,17 +90,9 @@ embs = reranker([text] + back_english_list)
 if not embs or len(embs[0]) == 0:
     print("[ERROR] Query embedding is empty for reranking. Skipping reranking and fusion.")
     sys.exit(1)
-q_emb = np.array(embs[0])
-sims = []
-for i, e in enumerate(embs[1:]):
-    if e and len(e) == len(q_emb):
-        d = np.array(e)
-        sim = float(np.dot(q_emb, d) / (np.linalg.norm(q_emb) * np.linalg.norm(d) + 1e-8))
-        sims.append((i, sim))
-    else:
-        print(f"[WARN] Skipping doc {i} due to empty or mismatched embedding.")
+# Vectorized cosine scores; only the 14 best are needed for fusion
+sims = rerank(embs[0], embs[1:], k=14)
 scored = [(sim, valid_results[idx]) for idx, sim in sims]
-scored.sort(reverse=True, key=lambda x: x[0])
 
 # Top 3 and 4th-14th for fusion
 fuse_top3 = [r['japanese'] for _, r in scored[:3]]
@@ -107,23 +103,23 @@ model_name = valid_results[0].get('model', 'qwen2.5:7b-instruct')
 fuse_prompt_top3 = """Fuse these Japanese sentences into one natural, fluent Japanese translation that preserves all the original meaning, is not overly formal, and is suitable for a general audience. Only output the Japanese translation, no commentary.\n\n"""
 for idx, jp in enumerate(fuse_top3):
     fuse_prompt_top3 += f"{idx+1}. {jp}\n"
-fused_top3 = call_ollama_generation(fuse_prompt_top3, model_name)
+fused_top3 = call_ollama_generation(fuse_prompt_top3, model_name, stage='fuse', source=fuse_top3)
 fused_top3 = parse_translation_output(fused_top3)['japanese']
 
 # LLM Fusion of 4th-14th
 fuse_prompt_4_14 = """Fuse these Japanese sentences into one natural, fluent Japanese translation that preserves all the original meaning, is not overly formal, and is suitable for a general audience. Only output the Japanese translation, no commentary.\n\n"""
 for idx, jp in enumerate(fuse_4_14):
     fuse_prompt_4_14 += f"{idx+4}. {jp}\n"
-fused_4_14 = call_ollama_generation(fuse_prompt_4_14, model_name)
+fused_4_14 = call_ollama_generation(fuse_prompt_4_14, model_name, stage='fuse', source=fuse_4_14)
 fused_4_14 = parse_translation_output(fused_4_14)['japanese']
 
 # Final LLM Fusion of the two fusions
 final_fuse_prompt = """Fuse these two Japanese translations into one final, natural, fluent Japanese translation that preserves all the original meaning, is not overly formal, and is suitable for a general audience. Only output the Japanese translation, no commentary.\n\n1. """ + fused_top3 + "\n2. " + fused_4_14 + "\n"
-final_fused_japanese = call_ollama_generation(final_fuse_prompt, model_name)
+final_fused_japanese = call_ollama_generation(final_fuse_prompt, model_name, stage='fuse', source=[fused_top3, fused_4_14])
 final_fused_japanese = parse_translation_output(final_fused_japanese)['japanese']
 
 # Backtranslate the final fused Japanese to English using the LLM
-final_fused_back_en = call_ollama_generation(f"Translate this to English. Only output the English translation, no commentary or explanation:\n\n{final_fused_japanese}", model_name)
+final_fused_back_en = call_ollama_generation(f"Translate this to English. Only output the English translation, no commentary or explanation:\n\n{final_fused_japanese}", model_name, stage='backtranslate', source=final_fused_japanese)
 final_fused_back_en = parse_backtranslation_output(final_fused_back_en)['english']
 
 # Build histogram
@@ -0,0 +1,214 @@
+# In-memory leased work queue behind the distributed coordinator.
+# A job is split into one task per run. Dispatch pops the oldest ready task and leases it
+# for `lease_timeout` seconds; a task whose lease runs out (its worker died or hung) goes
+# back on the queue for another worker. Every operation is O(1) amortized:
+#   ready   - deque of work_ids waiting for a worker (completed ones are skipped lazily)
+#   leases  - OrderedDict work_id -> deadline; leases all last lease_timeout, so insertion
+#             order is deadline order and expiry only ever looks at the head
+#   tasks / jobs - dicts keyed by work_id / job_id; results are kept per job in completion order
+#   finished - deque of (finish time, job_id) in finish order, so eviction only looks at the head
+# A task is dropped once it has a result, and a finished job (with its results) is evicted
+# `job_ttl` seconds after it finished, so a long-running coordinator does not grow without bound.
+# The first result submitted for a task wins; late submissions from a worker whose lease
+# had already expired are acknowledged but not stored twice.
+# lease(wait=...) long-polls: an idle worker blocks on a condition that start_job notifies,
+# waking early for the next lease deadline so expired tasks are redispatched on time.
+# results(since=...) is a cursor into a job's append-only result list, so a client polling
+# for progress only receives results it has not seen; with wait=... it blocks until a new
+# result arrives or the job is done.
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+
+class WorkQueue:
+    def __init__(self, lease_timeout=600.0, max_attempts=3, job_ttl=3600.0):
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self.job_ttl = job_ttl
+        self._lock = threading.Lock()
+        self._work_ready = threading.Condition(self._lock)
+        self._results_ready = threading.Condition(self._lock)
+        self._ready = deque()
+        self._leases = OrderedDict()
+        self._tasks = {}
+        self._jobs = {}
+        self._finished = deque()
+        self.latest_job_id = None
+        self.requeued = 0
+
+    def start_job(self, text, model, runs):
+        # Enqueues `runs` tasks for one text; returns the job summary
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._evict_jobs(time.monotonic())
+            job = self._jobs[job_id] = {
+                'job_id': job_id,
+                'text': text,
+                'model': model,
+                'runs': runs,
+                'created': time.time(),
+                'results': [],
+                'done': set()
+            }
+            for run in range(1, runs + 1):
+                work_id = f"{job_id}-{run}"
+                self._tasks[work_id] = {
+                    'work_id': work_id,
+                    'job_id': job_id,
+                    'text': text,
+                    'model': model,
+                    'run': run,
+                    'attempts': 0
+                }
+                self._ready.append(work_id)
+            self.latest_job_id = job_id
+            self._work_ready.notify_all()
+            return self._summary(job)
+
+    def _expire_leases(self, now):
+        while self._leases:
+            work_id, deadline = next(iter(self._leases.items()))
+            if deadline > now:
+                return
+            self._leases.popitem(last=False)
+            task = self._tasks.get(work_id)
+            if task is None:
+                continue
+            if task['attempts'] >= self.max_attempts:
+                print(f"[COORDINATOR] Giving up on {work_id} after {task['attempts']} expired leases")
+                self._complete(task, {'japanese': '', 'run': task['run'], 'model': task['model'],
+                                      'input_text': task['text'], 'work_id': work_id,
+                                      'error': f"lease expired {task['attempts']} times"})
+                continue
+            print(f"[COORDINATOR] Lease on {work_id} expired; requeueing")
+            self.requeued += 1
+            self._ready.append(work_id)
+
+    def lease(self, wait=0.0):
+        # The next task (a copy, with its lease timeout), waiting up to `wait` seconds for one;
+        # None when nothing is ready by then
+        tasks = self.lease_many(1, wait)
+        return tasks[0] if tasks else None
+
+    def lease_many(self, max_tasks, wait=0.0):
+        # Up to `max_tasks` tasks, waiting up to `wait` seconds for the first; [] when none arrive
+        deadline = time.monotonic() + wait
+        with self._lock:
+            while True:
+                now = time.monotonic()
+                self._expire_leases(now)
+                self._evict_jobs(now)
+                tasks = []
+                while len(tasks) < max_tasks:
+                    task = self._pop_ready(now)
+                    if task is None:
+                        break
+                    tasks.append(task)
+                if tasks:
+                    return tasks
+                remaining = deadline - now
+                if remaining <= 0:
+                    return []
+                if self._leases:
+                    remaining = min(remaining, max(0.0, next(iter(self._leases.values())) - now))
+                self._work_ready.wait(remaining)
+
+    def _pop_ready(self, now):
+        while self._ready:
+            work_id = self._ready.popleft()
+            task = self._tasks.get(work_id)
+            if task is None:
+                continue
+            task['attempts'] += 1
+            self._leases.pop(work_id, None)
+            self._leases[work_id] = now + self.lease_timeout
+            return {**{k: v for k, v in task.items() if k != 'attempts'}, 'lease_timeout': self.lease_timeout}
+        return None
+
+    def _complete(self, task, result):
+        job = self._jobs[task['job_id']]
+        job['done'].add(task['work_id'])
+        job['results'].append(result)
+        self._leases.pop(task['work_id'], None)
+        del self._tasks[task['work_id']]
+        if len(job['done']) >= job['runs']:
+            self._finished.append((time.monotonic(), job['job_id']))
+        self._results_ready.notify_all()
+
+    def _evict_jobs(self, now):
+        while self._finished and self._finished[0][0] + self.job_ttl <= now:
+            _, job_id = self._finished.popleft()
+            self._jobs.pop(job_id, None)
+            if self.latest_job_id == job_id:
+                self.latest_job_id = None
+
+    def submit(self, work_id, result):
+        # 'ok' (stored), 'duplicate' (task already had a result) or 'unknown'
+        with self._lock:
+            return self._submit(work_id, result)
+
+    def submit_many(self, items):
+        # [(work_id, result), ...] -> {work_id: status}, under one lock acquisition
+        with self._lock:
+            return {work_id: self._submit(work_id, result) for work_id, result in items}
+
+    def _submit(self, work_id, result):
+        task = self._tasks.get(work_id)
+        if task is None:
+            # Completed tasks are dropped; their job still knows them until it is evicted
+            job = self._jobs.get(work_id.rpartition('-')[0])
+            return 'duplicate' if job is not None and work_id in job['done'] else 'unknown'
+        if isinstance(result, dict):
+            result = {**result, 'work_id': work_id}
+        self._complete(task, result)
+        return 'ok'
+
+    def _summary(self, job):
+        return {
+            'job_id': job['job_id'],
+            'runs': job['runs'],
+            'completed': len(job['done']),
+            'done': len(job['done']) >= job['runs']
+        }
+
+    def results(self, job_id=None, since=0, wait=0.0):
+        # (summary, results after the first `since` in completion order) for a job (default:
+        # the latest), waiting up to `wait` seconds for one if there are none yet and the job
+        # is not done; summary['cursor'] is the `since` for the next call. (None, []) if unknown.
+        deadline = time.monotonic() + wait
+        with self._lock:
+            job = self._jobs.get(job_id or self.latest_job_id)
+            if job is None:
+                return None, []
+            while len(job['results']) <= since and len(job['done']) < job['runs']:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._results_ready.wait(remaining)
+            return {**self._summary(job), 'cursor': len(job['results'])}, job['results'][since:]
+
+    def wait_for_job(self, job_id, timeout=0.0):
+        # Job summary once it is done or `timeout` seconds have passed; None if unknown
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            while len(job['done']) < job['runs']:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._results_ready.wait(remaining)
+            return {**self._summary(job), 'cursor': len(job['results'])}
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'jobs': len(self._jobs),
+                'tasks': len(self._tasks),
+                'ready': len(self._ready),
+                'leased': len(self._leases),
+                'requeued': self.requeued
+            }
@@ -1,73 +1,158 @@
+# Distributed translation worker: leases tasks from the coordinator, translates and
+# backtranslates them and submits the result as JSON.
+# By default tasks run in this process on the shared Ollama client, so its keep-alive
+# connections, response cache and prompt KV-cache stay warm across tasks. --isolation
+# subprocess runs each task in a fresh interpreter instead (worker.py --run_task, task JSON
+# on stdin, result JSON on stdout), for when a crash or leak in one task must not take
+# the worker down; it pays interpreter startup and imports on every task.
+# With --concurrency N the worker leases up to N tasks per request, runs them concurrently
+# and submits their results in one /submit-translations request.
+# Usage: python worker.py http://localhost:5000 [--concurrency 4] [--isolation subprocess]
+import argparse
+import contextlib
+import os
 import requests
 import time
 import sys
 import json
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
-def get_work(server_url):
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'onebatch'))
+from ollama_client import get_client, add_client_args, configure_client_from_args
+from token_budget import num_predict
+from stop_rules import rules_for_stage
+from cli_gen_prime import parse_translation_output, parse_backtranslation_output, translate_prompt, backtranslate_prompt
+
+# Seconds to back off after the coordinator could not be reached
+ERROR_BACKOFF = 5
+
+def get_work(server_url, wait=0.0, max_tasks=1):
+    # Leases up to `max_tasks` tasks; long-polls, the coordinator holds the request up to
+    # `wait` seconds until one is ready. [] when there is no work.
     try:
-        resp = requests.get(f'{server_url}/get-work')
+        resp = requests.get(f'{server_url}/get-work', params={'wait': wait, 'max_tasks': max_tasks}, timeout=wait + 30)
         if resp.status_code == 200:
-            return resp.json()
-        else:
-            return None
+            return resp.json().get('tasks', [])
+        if resp.status_code != 204:
+            print(f"[WORKER] Coordinator returned {resp.status_code} for /get-work")
+            time.sleep(ERROR_BACKOFF)
+        return []
     except Exception as e:
         print(f"[WORKER] Error getting work: {e}")
-        return None
+        time.sleep(ERROR_BACKOFF)
+        return []
 
-def submit_translation(server_url, work_id, translation_result):
+def submit_translations(server_url, results):
+    # Submits {work_id: result} in one request; returns {work_id: status}, {} on failure
     try:
-        # Ensure work_id is included in the result dict for uniqueness
-        if isinstance(translation_result, dict):
-            translation_result['work_id'] = work_id
-        resp = requests.post(f'{server_url}/submit-translation', json={
-            'work_id': work_id,
-            'result': translation_result
+        # Ensure work_id is included in each result dict for uniqueness
+        for work_id, result in results.items():
+            if isinstance(result, dict):
+                result['work_id'] = work_id
+        resp = requests.post(f'{server_url}/submit-translations', json={
+            'results': [{'work_id': work_id, 'result': result} for work_id, result in results.items()]
         })
-        return resp.status_code == 200
+        if resp.status_code == 200:
+            return resp.json().get('statuses', {})
+        print(f"[WORKER] Coordinator returned {resp.status_code} for /submit-translations")
+        return {}
     except Exception as e:
-        print(f"[WORKER] Error submitting translation: {e}")
-        return False
+        print(f"[WORKER] Error submitting translations: {e}")
+        return {}
 
-def do_translation(task):
+def generate(prompt, model, stage, source, sample):
+    stop, until = rules_for_stage(stage)
+    return get_client().generate(prompt, model=model, max_new_tokens=num_predict(stage, source), sample=sample,
+                                 stage=stage, stop=stop, until=until)
+
+def translate_task(task):
+    # One run: the task text is the English source, wrapped in the same translate prompt as
+    # onebatch; the Japanese is backtranslated for reranking by the aggregator
     text = task['text']
     run = task['run']
     model = task['model']
-    # Call translate_one.py as a subprocess
+    start = time.perf_counter()
     try:
-        proc = subprocess.run([
-            sys.executable, 'translate_one.py',
-            '--text', text,
-            '--model', model,
-            '--run', str(run)
-        ], capture_output=True, text=True, timeout=600)
-        # The script prints a dict, so eval is safe here (or use json if you change print to json)
-        out = proc.stdout.strip()
-        if out.startswith('{') and out.endswith('}'):  # crude check
-            result = eval(out)
-        else:
-            result = {'japanese': '', 'run': run, 'model': model, 'input_text': text, 'error': out}
-        return result
+        japanese = parse_translation_output(generate(translate_prompt(text), model, 'translate', text, run))['japanese']
+        back_english = ''
+        if japanese:
+            back_raw = generate(backtranslate_prompt(japanese), model, 'backtranslate', japanese, run)
+            back_english = parse_backtranslation_output(back_raw)['english']
+        result = {'japanese': japanese, 'back_english': back_english, 'run': run, 'model': model, 'input_text': text}
     except Exception as e:
-        return {'japanese': '', 'run': run, 'model': model, 'input_text': text, 'error': str(e)}
+        result = {'japanese': '', 'run': run, 'model': model, 'input_text': text, 'error': str(e)}
+    result['elapsed_s'] = round(time.perf_counter() - start, 3)
+    return result
+
+def translate_task_subprocess(task, timeout=600, argv=()):
+    # `argv` forwards the worker's client flags to the child
+    run = task['run']
+    model = task['model']
+    text = task['text']
+    try:
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), *argv, '--run_task'],
+                              input=json.dumps(task), capture_output=True, text=True, timeout=timeout)
+        if proc.returncode == 0:
+            # Import-time logging may precede it; the result is the last line
+            return json.loads(proc.stdout.strip().splitlines()[-1])
+        error = (proc.stderr.strip().splitlines() or [f"exit code {proc.returncode}"])[-1]
+    except (subprocess.TimeoutExpired, ValueError, IndexError) as e:
+        error = str(e)
+    return {'japanese': '', 'run': run, 'model': model, 'input_text': text, 'error': error}
+
+def run_task_stdio():
+    # --run_task: task JSON on stdin -> result JSON as the last stdout line (task logs go to stderr)
+    task = json.load(sys.stdin)
+    with contextlib.redirect_stdout(sys.stderr):
+        result = translate_task(task)
+    print(json.dumps(result, ensure_ascii=False))
+
+def main():
+    parser = argparse.ArgumentParser(description='Distributed translation worker')
+    parser.add_argument('server_url', nargs='?', help='Coordinator URL, e.g. http://localhost:5000')
+    parser.add_argument('--isolation', choices=['inprocess', 'subprocess'], default='inprocess',
+                        help='Run each task in this process (default) or in a fresh interpreter')
+    parser.add_argument('--task_timeout', type=float, default=600.0, help='Seconds before a subprocess task is killed')
+    parser.add_argument('--poll_wait', type=float, default=20.0,
+                        help='Seconds each /get-work request waits on the coordinator for a task (0 polls)')
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help='Tasks leased per request and run concurrently against the local Ollama')
+    parser.add_argument('--run_task', action='store_true', help=argparse.SUPPRESS)
+    add_client_args(parser)
+    args = parser.parse_args()
+    if args.concurrency < 1:
+        parser.error('--concurrency must be at least 1')
+    configure_client_from_args(args, min_pool_size=args.concurrency)
+    if args.run_task:
+        run_task_stdio()
+        return
+    if not args.server_url:
+        parser.error('server_url is required')
+    server_url = args.server_url
+    print(f"[WORKER] Starting worker for server: {server_url} ({args.isolation})")
+    if args.isolation == 'subprocess':
+        run_one = lambda task: translate_task_subprocess(task, args.task_timeout, sys.argv[1:])
+    else:
+        run_one = translate_task
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        while True:
+            tasks = get_work(server_url, args.poll_wait, args.concurrency)
+            if not tasks:
+                if args.poll_wait <= 0:
+                    print("[WORKER] No work available. Sleeping...")
+                    time.sleep(5)
+                continue
+            print(f"[WORKER] Got {len(tasks)} task(s): runs {', '.join(str(t['run']) for t in tasks)}")
+            start = time.perf_counter()
+            results = dict(zip((t['work_id'] for t in tasks), pool.map(run_one, tasks)))
+            statuses = submit_translations(server_url, results)
+            submitted = sum(1 for status in statuses.values() if status in ('ok', 'duplicate'))
+            print(f"[WORKER] Submitted {submitted}/{len(tasks)} results in {time.perf_counter() - start:.2f}s")
+            for work_id in results:
+                if statuses.get(work_id) not in ('ok', 'duplicate'):
+                    print(f"[WORKER] Failed to submit result for work_id {work_id}")
 
 if __name__ == '__main__':
-    if len(sys.argv) < 2:
-        print("Usage: python worker.py <server_url>")
-        sys.exit(1)
-    server_url = sys.argv[1]
-    print(f"[WORKER] Starting worker for server: {server_url}")
-    while True:
-        task = get_work(server_url)
-        if not task or not task.get('work_id'):
-            print("[WORKER] No work available. Sleeping...")
-            time.sleep(5)
-            continue
-        print(f"[WORKER] Got work: {task}")
-        result = do_translation(task)
-        success = submit_translation(server_url, task['work_id'], result)
-        if success:
-            print(f"[WORKER] Submitted result for work_id {task['work_id']}")
-        else:
-            print(f"[WORKER] Failed to submit result for work_id {task['work_id']}")
-        time.sleep(1)
+    main()
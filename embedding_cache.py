@@ -0,0 +1,182 @@
+# Shared on-disk embedding store keyed by (model, text hash).
+# Vectors live in one memory-mapped float32 file per model (capacity x dim rows); a small
+# SQLite index maps keys to rows and tracks last access for LRU eviction. Several processes
+# (webapp, CLI, workers) can open the same directory: the OS page cache holds the vectors
+# once, and nothing is loaded into memory beyond the rows actually read.
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+DEFAULT_EMBED_CACHE_DIR = os.environ.get("OLLAMA_EMBED_CACHE_DIR", "")
+DEFAULT_EMBED_CACHE_CAPACITY = int(os.environ.get("OLLAMA_EMBED_CACHE_CAPACITY", "100000"))
+
+
+class EmbeddingStore:
+    def __init__(self, directory, capacity=DEFAULT_EMBED_CACHE_CAPACITY):
+        self.directory = directory
+        self.capacity = capacity
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(directory, "index.sqlite"), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS models ("
+            " model TEXT PRIMARY KEY, dim INTEGER, capacity INTEGER, filename TEXT, next_slot INTEGER)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " model TEXT, key TEXT, slot INTEGER, last_access REAL, PRIMARY KEY (model, key))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries(model, last_access)")
+        self._conn.commit()
+        self._maps = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def text_key(text):
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _model_info(self, model):
+        return self._conn.execute(
+            "SELECT dim, capacity, filename, next_slot FROM models WHERE model = ?", (model,)).fetchone()
+
+    def _memmap(self, model, info):
+        dim, capacity, filename, _ = info
+        mm = self._maps.get(model)
+        if mm is None:
+            path = os.path.join(self.directory, filename)
+            mode = "r+" if os.path.exists(path) else "w+"
+            mm = np.memmap(path, dtype=np.float32, mode=mode, shape=(capacity, dim))
+            self._maps[model] = mm
+        return mm
+
+    def get_many(self, model, texts):
+        # One float32 row (np.ndarray copy) or None per text, in order.
+        # The index lookup and the row copies happen under the database write lock
+        # (BEGIN IMMEDIATE), the same lock put_many holds while it evicts and overwrites
+        # rows, so another process cannot reassign a slot between reading its index entry
+        # and copying it. A plain read transaction would not do: in WAL mode readers do not
+        # block writers, and the memory-mapped rows are not versioned by SQLite.
+        out = [None] * len(texts)
+        with self._lock:
+            info = self._model_info(model)
+            if info is None:
+                self.misses += len(texts)
+                return out
+            mm = self._memmap(model, info)
+            keys = [self.text_key(t) for t in texts]
+            slots = {}
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for i in range(0, len(keys), 500):
+                    chunk = keys[i:i + 500]
+                    rows = self._conn.execute(
+                        f"SELECT key, slot FROM entries WHERE model = ? AND key IN ({','.join('?' * len(chunk))})",
+                        [model] + chunk).fetchall()
+                    slots.update(rows)
+                for i, k in enumerate(keys):
+                    slot = slots.get(k)
+                    if slot is not None:
+                        out[i] = np.array(mm[slot])
+                if slots:
+                    now = time.time()
+                    self._conn.executemany("UPDATE entries SET last_access = ? WHERE model = ? AND key = ?",
+                                           [(now, model, k) for k in slots])
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+            self.hits += len(slots)
+            self.misses += len(texts) - sum(1 for v in out if v is not None)
+        return out
+
+    def put_many(self, model, texts, vectors):
+        # Stores valid (non-empty, non-zero) vectors; evicts least-recently-used rows when full
+        pending = []
+        for t, v in zip(texts, vectors):
+            if v is None or len(v) == 0:
+                continue
+            arr = np.asarray(v, dtype=np.float32)
+            if not np.any(arr):
+                continue
+            pending.append((self.text_key(t), arr))
+        if not pending:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                info = self._model_info(model)
+                if info is None:
+                    filename = hashlib.sha1(model.encode("utf-8")).hexdigest()[:16] + ".f32"
+                    info = (len(pending[0][1]), self.capacity, filename, 0)
+                    self._conn.execute("INSERT INTO models VALUES (?, ?, ?, ?, ?)", (model,) + info)
+                dim, capacity, _, next_slot = info
+                mm = self._memmap(model, info)
+                now = time.time()
+                for key, arr in pending:
+                    if len(arr) != dim:
+                        continue
+                    row = self._conn.execute(
+                        "SELECT slot FROM entries WHERE model = ? AND key = ?", (model, key)).fetchone()
+                    if row is not None:
+                        continue
+                    if next_slot < capacity:
+                        slot = next_slot
+                        next_slot += 1
+                    else:
+                        old_key, slot = self._conn.execute(
+                            "SELECT key, slot FROM entries WHERE model = ? ORDER BY last_access ASC LIMIT 1",
+                            (model,)).fetchone()
+                        self._conn.execute("DELETE FROM entries WHERE model = ? AND key = ?", (model, old_key))
+                        self.evictions += 1
+                    mm[slot] = arr
+                    self._conn.execute("INSERT INTO entries VALUES (?, ?, ?, ?)", (model, key, slot, now))
+                # Vectors reach the file before the index rows that point at them become visible
+                mm.flush()
+                self._conn.execute("UPDATE models SET next_slot = ? WHERE model = ?", (next_slot, model))
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+
+    def lookup(self, model, texts):
+        # (vectors, missing_indices): cached rows as lists, None where the text must be embedded
+        vectors = [v.tolist() if v is not None else None for v in self.get_many(model, texts)]
+        return vectors, [i for i, v in enumerate(vectors) if v is None]
+
+    def fill(self, model, texts, vectors, missing, fresh):
+        # Stores freshly embedded vectors and merges them into the lookup() result
+        self.put_many(model, [texts[i] for i in missing], fresh)
+        for i, v in zip(missing, fresh):
+            vectors[i] = v
+        return vectors
+
+    def get_stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                'entries': entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+    def print_stats(self):
+        s = self.get_stats()
+        print(f"[STATS] embedding cache: {s['hits']} hits, {s['misses']} misses, hit rate {s['hit_rate']:.1%}, "
+              f"{s['entries']} entries, {s['evictions']} evicted")
+
+    def close(self):
+        with self._lock:
+            for mm in self._maps.values():
+                mm.flush()
+            self._maps = {}
+            self._conn.close()
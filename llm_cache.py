@@ -0,0 +1,132 @@
+# Persistent content-addressed cache for Ollama generations (SQLite, LRU-bounded).
+# Keyed by (model, prompt, temperature, num_predict, seed, sample). `sample` is the draw
+# index for prompts that are sampled repeatedly (e.g. run 1..31), so a cached sweep replays
+# the same 31 distinct draws instead of 31 copies of the first one.
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = os.environ.get("OLLAMA_CACHE_PATH", "")
+DEFAULT_CACHE_POLICY = os.environ.get("OLLAMA_CACHE_POLICY", "deterministic")
+DEFAULT_CACHE_MAX_ENTRIES = int(os.environ.get("OLLAMA_CACHE_MAX_ENTRIES", "200000"))
+
+# When a generation may be served from the cache:
+#   off           - never (cache disabled)
+#   deterministic - only temperature 0 or a fixed seed, where Ollama would return the same text anyway
+#   always        - any temperature; sampled outputs are replayed per (prompt, sample) draw
+CACHE_POLICIES = ("off", "deterministic", "always")
+
+
+class LLMCache:
+    def __init__(self, path, policy=DEFAULT_CACHE_POLICY, max_entries=DEFAULT_CACHE_MAX_ENTRIES):
+        if policy not in CACHE_POLICIES:
+            raise ValueError(f"Unknown cache policy {policy!r}; expected one of {CACHE_POLICIES}")
+        self.path = path
+        self.policy = policy
+        self.max_entries = max_entries
+        cache_dir = os.path.dirname(path)
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, model TEXT, temperature REAL, response TEXT,"
+            " created REAL, last_access REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses(last_access)")
+        self._conn.commit()
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(model, prompt, temperature, num_predict, seed=None, sample=None):
+        raw = json.dumps([model, prompt, float(temperature), num_predict, seed, sample], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def cacheable(self, temperature, seed=None):
+        if self.policy == "always":
+            return True
+        if self.policy == "deterministic":
+            return temperature == 0 or seed is not None
+        return False
+
+    def get(self, model, prompt, temperature, num_predict, seed=None, sample=None):
+        # Returns the cached response text, or None on a miss / when the policy forbids reuse
+        if not self.cacheable(temperature, seed):
+            with self._lock:
+                self.bypassed += 1
+            return None
+        key = self.make_key(model, prompt, temperature, num_predict, seed, sample)
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            return row[0]
+
+    def put(self, model, prompt, temperature, num_predict, response, seed=None, sample=None):
+        if not self.cacheable(temperature, seed):
+            return
+        key = self.make_key(model, prompt, temperature, num_predict, seed, sample)
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT OR IGNORE INTO responses (key, model, temperature, response, created, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?)", (key, model, float(temperature), response, now, now))
+            self._entries += cur.rowcount
+            if self._entries > self.max_entries:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        # Drop least-recently-used rows down to 90% of max_entries (caller holds the lock)
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        excess = self._entries - int(self.max_entries * 0.9)
+        if excess <= 0:
+            return
+        self._conn.execute(
+            "DELETE FROM responses WHERE key IN"
+            " (SELECT key FROM responses ORDER BY last_access ASC LIMIT ?)", (excess,))
+        self._entries -= excess
+        self.evictions += excess
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'policy': self.policy,
+                'entries': self._entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'bypassed': self.bypassed,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+    def print_stats(self):
+        s = self.get_stats()
+        print(f"[STATS] cache ({s['policy']}): {s['hits']} hits, {s['misses']} misses, "
+              f"{s['bypassed']} bypassed, hit rate {s['hit_rate']:.1%}, {s['entries']} entries, "
+              f"{s['evictions']} evicted")
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._entries = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
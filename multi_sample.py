@@ -0,0 +1,74 @@
+# Multi-sample generation: one request asks for k numbered alternatives instead of one
+# answer, so the long instruction prompt is evaluated once per k candidates. Replies are
+# split by parse_numbered_candidates; if a reply yields fewer than asked for, the gap is
+# filled with ordinary single-sample calls. The stats record calls saved and how many
+# distinct candidates survived, for comparison with one-sample mode.
+import os
+import re
+
+from candidates import normalize_candidate
+
+DEFAULT_SAMPLES_PER_CALL = int(os.environ.get("SAMPLES_PER_CALL", "1"))
+
+# "1. ...", "2) ...", "(3) ...", "４．...", "（５）..." (\d also matches full-width digits)
+NUMBERED_LINE = re.compile(r'^\s*[\(（]?(\d{1,2})\s*[\.\)）．、:：]\s*(.*)$')
+
+
+def parse_numbered_candidates(output, keep=None):
+    # Candidates in reply order. Lines after a numbered line continue that candidate (a
+    # multi-sentence translation may wrap) when keep(line) accepts them; text before the
+    # first number and lines keep() rejects (commentary, notes) are dropped. Only whitespace
+    # is collapsed: the text is kept as generated, NFKC is for duplicate keys only.
+    candidates = []
+    current = None
+    for line in (output or '').splitlines():
+        line = re.sub(r'\s+', ' ', line).strip()
+        if not line:
+            continue
+        m = NUMBERED_LINE.match(line)
+        if m:
+            current = [m.group(2)] if m.group(2) else []
+            candidates.append(current)
+        elif current is not None and (keep is None or keep(line)):
+            current.append(line)
+    out = []
+    for parts in candidates:
+        text = ' '.join(parts).strip().strip('"\'「」')
+        if text and (keep is None or keep(text)):
+            out.append(text)
+    return out
+
+
+def collect_samples(n, per_call, multi, single):
+    # n candidates from multi(call_idx, k) -> [candidate, ...] calls asking for k at a time,
+    # topped up with single(i) -> candidate calls. Returns (candidates, stats).
+    samples = []
+    multi_calls = 0
+    if per_call > 1:
+        for call_idx in range(-(-n // per_call)):
+            k = min(per_call, n - len(samples))
+            if k <= 0:
+                break
+            got = [c for c in multi(call_idx, k) if c][:k]
+            multi_calls += 1
+            if len(got) < k:
+                print(f"[WARN] Multi-sample call {call_idx+1} returned {len(got)}/{k} candidates")
+            samples.extend(got)
+    single_calls = 0
+    while len(samples) < n:
+        samples.append(single(len(samples)))
+        single_calls += 1
+    unique = len({normalize_candidate(s) for s in samples if s})
+    stats = {
+        'samples_per_call': max(1, per_call),
+        'candidates': n,
+        'multi_calls': multi_calls,
+        'single_calls': single_calls,
+        'calls': multi_calls + single_calls,
+        'calls_saved': n - multi_calls - single_calls,
+        'unique_candidates': unique,
+        'unique_rate': unique / n if n else 0.0
+    }
+    print(f"[INFO] {n} candidates from {stats['calls']} calls ({multi_calls} multi-sample, {single_calls} single), "
+          f"{unique} unique")
+    return samples, stats
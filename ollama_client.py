@@ -0,0 +1,510 @@
+# Shared Ollama HTTP client used by every entry point (onebatch, tempspread, promptblend, statsig).
+# One requests.Session with a keep-alive connection pool, so the 62+ calls per batch reuse
+# a handful of TCP connections to localhost:11434 instead of opening one per call.
+import json
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from llm_cache import LLMCache, CACHE_POLICIES, DEFAULT_CACHE_PATH, DEFAULT_CACHE_POLICY, DEFAULT_CACHE_MAX_ENTRIES
+from embedding_cache import EmbeddingStore, DEFAULT_EMBED_CACHE_DIR, DEFAULT_EMBED_CACHE_CAPACITY
+from token_budget import (configure_token_budget, parse_ratios, DEFAULT_NUM_PREDICT_RATIOS, DEFAULT_NUM_PREDICT_MARGIN,
+                          DEFAULT_NUM_PREDICT_MAX)
+
+OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://localhost:11434")
+DEFAULT_MODEL = "qwen2.5:7b-instruct"
+DEFAULT_POOL_SIZE = int(os.environ.get("OLLAMA_POOL_SIZE", "8"))
+DEFAULT_CONNECT_TIMEOUT = float(os.environ.get("OLLAMA_CONNECT_TIMEOUT", "5"))
+DEFAULT_READ_TIMEOUT = float(os.environ.get("OLLAMA_READ_TIMEOUT", "120"))
+DEFAULT_EMBED_BATCH_SIZE = int(os.environ.get("OLLAMA_EMBED_BATCH_SIZE", "32"))
+# How long Ollama keeps the model (and the KV cache of the last prompt in each slot) loaded
+# after a call; empty leaves the server default
+DEFAULT_KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")
+
+
+def build_generate_payload(prompt, model, max_new_tokens, temperature, seed=None, keep_alive=DEFAULT_KEEP_ALIVE,
+                           context=None, stop=None):
+    options = {"num_predict": max_new_tokens, "temperature": temperature}
+    if seed is not None:
+        options["seed"] = seed
+    if stop:
+        options["stop"] = list(stop)
+    payload = {"model": model, "prompt": prompt, "options": options}
+    if keep_alive:
+        payload["keep_alive"] = keep_alive
+    if context is not None:
+        payload["context"] = context
+    return payload
+
+
+class PromptEvalTracker:
+    # Turns the timing fields of Ollama's final /api/generate chunk into per-call metrics.
+    # While the model stays loaded, the runner reuses the KV cache for the longest prefix a
+    # prompt shares with the previous one in its slot, and prompt_eval_count only counts the
+    # tokens it actually had to evaluate. The full token count of a prompt is taken as the
+    # largest count seen for it, so repeats of the same prompt (the 31 forward translations)
+    # report the tokens served from cache and the prompt-eval time that saved, estimated at
+    # the model's observed prompt-eval rate.
+    def __init__(self, max_prompts=4096):
+        self._lock = threading.Lock()
+        self._full_tokens = {}
+        self._rate = {}
+        self.max_prompts = max_prompts
+
+    def observe(self, model, prompt, final):
+        count = final.get('prompt_eval_count') or 0
+        duration_s = (final.get('prompt_eval_duration') or 0) / 1e9
+        key = (model, hash(prompt))
+        with self._lock:
+            tokens, seconds = self._rate.get(model, (0, 0.0))
+            if count and duration_s:
+                tokens, seconds = tokens + count, seconds + duration_s
+                self._rate[model] = (tokens, seconds)
+            if key not in self._full_tokens and len(self._full_tokens) >= self.max_prompts:
+                self._full_tokens.pop(next(iter(self._full_tokens)))
+            full = self._full_tokens[key] = max(self._full_tokens.get(key, 0), count)
+        # Ollama leaves prompt_eval_count out when the whole prompt came from the cache; with
+        # no final chunk at all (stream cut short) nothing is known
+        cached = full - count if final.get('done') else 0
+        return {
+            'prompt_tokens': count,
+            'prompt_eval_s': duration_s,
+            'cached_prompt_tokens': cached,
+            'saved_prompt_eval_s': cached * seconds / tokens if tokens else 0.0,
+            'eval_tokens': final.get('eval_count') or 0,
+            'eval_s': (final.get('eval_duration') or 0) / 1e9,
+            'load_s': (final.get('load_duration') or 0) / 1e9,
+            'done_reason': final.get('done_reason'),
+            'context': final.get('context')
+        }
+
+
+class LatencyStats:
+    # Per-endpoint call counters shared by the sync and async clients
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record_generation(self, endpoint, metrics, stage=None):
+        # Token and prompt-cache totals from PromptEvalTracker metrics, plus generations that
+        # stopped on num_predict (done_reason "length"), counted per pipeline stage
+        with self._lock:
+            s = self._stats.setdefault(endpoint, {
+                'calls': 0, 'errors': 0, 'total_s': 0.0, 'min_s': None, 'max_s': 0.0
+            })
+            for field in ('prompt_tokens', 'prompt_eval_s', 'cached_prompt_tokens', 'saved_prompt_eval_s',
+                          'eval_tokens', 'eval_s'):
+                s[field] = s.get(field, 0) + metrics[field]
+            s.setdefault('truncated', {})
+            if metrics['done_reason'] == 'length':
+                s['truncated'][stage or 'other'] = s['truncated'].get(stage or 'other', 0) + 1
+            s['early_stops'] = s.get('early_stops', 0) + (metrics['done_reason'] == 'early_stop')
+
+    def record(self, endpoint, elapsed, ok):
+        with self._lock:
+            s = self._stats.setdefault(endpoint, {
+                'calls': 0, 'errors': 0, 'total_s': 0.0, 'min_s': None, 'max_s': 0.0
+            })
+            s['calls'] += 1
+            if not ok:
+                s['errors'] += 1
+            s['total_s'] += elapsed
+            s['max_s'] = max(s['max_s'], elapsed)
+            s['min_s'] = elapsed if s['min_s'] is None else min(s['min_s'], elapsed)
+
+    def snapshot(self):
+        # Copy of the counters, with the mean filled in
+        with self._lock:
+            out = {}
+            for endpoint, s in self._stats.items():
+                s = dict(s)
+                if 'truncated' in s:
+                    s['truncated'] = dict(s['truncated'])
+                s['mean_s'] = s['total_s'] / s['calls'] if s['calls'] else 0.0
+                out[endpoint] = s
+            return out
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+
+    def print(self):
+        for endpoint, s in sorted(self.snapshot().items()):
+            print(f"[STATS] {endpoint}: {s['calls']} calls, {s['errors']} errors, "
+                  f"mean {s['mean_s']:.3f}s, min {s['min_s'] or 0.0:.3f}s, max {s['max_s']:.3f}s")
+            if 'prompt_tokens' in s:
+                print(f"[STATS] {endpoint}: {s['prompt_tokens']} prompt tokens evaluated in {s['prompt_eval_s']:.2f}s, "
+                      f"{s['cached_prompt_tokens']} served from the KV cache (~{s['saved_prompt_eval_s']:.2f}s saved), "
+                      f"{s['eval_tokens']} output tokens in {s['eval_s']:.2f}s")
+            if s.get('truncated'):
+                by_stage = ', '.join(f"{stage}: {n}" for stage, n in sorted(s['truncated'].items()))
+                print(f"[STATS] {endpoint}: {sum(s['truncated'].values())} generations hit num_predict ({by_stage})")
+            if s.get('early_stops'):
+                print(f"[STATS] {endpoint}: {s['early_stops']} streams closed early when commentary started")
+
+
+class OllamaClient:
+    def __init__(self, base_url=OLLAMA_URL, pool_size=DEFAULT_POOL_SIZE,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT, cache=None,
+                 embed_cache=None, keep_alive=DEFAULT_KEEP_ALIVE):
+        self.base_url = base_url.rstrip("/")
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.stats = LatencyStats()
+        # Optional LLMCache; generations it may serve never reach the server
+        self.cache = cache
+        # Optional EmbeddingStore; cached texts are not re-embedded
+        self.embed_cache = embed_cache
+        # None until the first /api/embed call tells us whether array input works
+        self.supports_embed_array = None
+        self.prompt_eval = PromptEvalTracker()
+        self._local = threading.local()
+
+    def last_generation(self):
+        # PromptEvalTracker metrics of this thread's latest /api/generate call
+        # ({'cached': True} if it came from the response cache)
+        return getattr(self._local, 'metrics', None)
+
+    def get_stats(self):
+        return self.stats.snapshot()
+
+    def reset_stats(self):
+        self.stats.reset()
+
+    def print_stats(self):
+        self.stats.print()
+        if self.cache is not None:
+            self.cache.print_stats()
+        if self.embed_cache is not None:
+            self.embed_cache.print_stats()
+
+    def post(self, path, payload, timeout=None):
+        # Non-streaming JSON POST (embeddings, etc.). Raises on HTTP/transport errors.
+        start = time.perf_counter()
+        ok = False
+        try:
+            resp = self.session.post(f"{self.base_url}{path}", json=payload, timeout=timeout or self.timeout)
+            resp.raise_for_status()
+            data = resp.json()
+            ok = True
+            return data
+        finally:
+            self.stats.record(path, time.perf_counter() - start, ok)
+
+    def embed_one(self, text, model=DEFAULT_MODEL):
+        # Legacy single-prompt endpoint; returns None if the response has no embedding
+        data = self.post("/api/embeddings", {"model": model, "prompt": text}, timeout=60)
+        if "embedding" not in data:
+            print(f"[ERROR] Ollama embedding response missing 'embedding' key. Full response: {data}")
+            return None
+        return data["embedding"]
+
+    def embed(self, texts, model=DEFAULT_MODEL, batch_size=DEFAULT_EMBED_BATCH_SIZE):
+        # Returns one vector (or None) per input text, in order; texts already in the
+        # embedding store are served from it and never sent to the server.
+        if self.embed_cache is None:
+            return self._embed_uncached(texts, model, batch_size)
+        vectors, missing = self.embed_cache.lookup(model, texts)
+        if not missing:
+            return vectors
+        fresh = self._embed_uncached([texts[i] for i in missing], model, batch_size)
+        return self.embed_cache.fill(model, texts, vectors, missing, fresh)
+
+    def _embed_uncached(self, texts, model, batch_size):
+        # Sends up to batch_size texts per /api/embed request (array input). If the server
+        # does not know /api/embed, remembers that and uses one /api/embeddings call per text.
+        # batch_size=1 always uses the per-text endpoint.
+        if batch_size <= 1:
+            return [self.embed_one(t, model=model) for t in texts]
+        vectors = []
+        for i in range(0, len(texts), batch_size):
+            chunk = list(texts[i:i + batch_size])
+            if self.supports_embed_array is not False:
+                try:
+                    data = self.post("/api/embed", {"model": model, "input": chunk})
+                    embs = data.get("embeddings")
+                    if isinstance(embs, list) and len(embs) == len(chunk):
+                        self.supports_embed_array = True
+                        vectors.extend(embs)
+                        continue
+                    print(f"[WARN] /api/embed returned {len(embs) if isinstance(embs, list) else 'no'} embeddings "
+                          f"for {len(chunk)} inputs. Falling back to per-text embeddings for this chunk.")
+                except requests.HTTPError as e:
+                    if e.response is None or e.response.status_code not in (404, 405):
+                        raise
+                    print("[WARN] Ollama server does not support array input on /api/embed. "
+                          "Falling back to per-text /api/embeddings.")
+                    self.supports_embed_array = False
+            vectors.extend(self.embed_one(t, model=model) for t in chunk)
+        return vectors
+
+    def generate(self, prompt, model=DEFAULT_MODEL, max_new_tokens=128, temperature=0.7, seed=None, sample=None,
+                 keep_alive=None, context=None, stage=None, stop=None, until=None):
+        # Streams /api/generate and returns the concatenated response text. Raises on
+        # HTTP/transport errors so callers keep their own fallback text. `sample` is the
+        # draw index used only as part of the cache key (see llm_cache). `context` is passed
+        # through to Ollama; per-call token and prompt-cache metrics are in last_generation().
+        # `stage` (translate, backtranslate, fuse, ...) labels truncation counts in the stats.
+        # `stop` sequences end the generation on the server; until(text_so_far) is checked at
+        # every line break and, once it returns True, the stream is closed so Ollama stops
+        # decoding (see stop_rules).
+        if self.cache is not None:
+            cached = self.cache.get(model, prompt, temperature, max_new_tokens, seed, sample)
+            if cached is not None:
+                self._local.metrics = {'cached': True}
+                return cached
+        payload = build_generate_payload(prompt, model, max_new_tokens, temperature, seed,
+                                         self.keep_alive if keep_alive is None else keep_alive, context, stop)
+        start = time.perf_counter()
+        ok = False
+        final = {}
+        try:
+            with self.session.post(f"{self.base_url}/api/generate", json=payload,
+                                   timeout=self.timeout, stream=True) as resp:
+                resp.raise_for_status()
+                output = ""
+                for line in resp.iter_lines():
+                    if not line:
+                        continue
+                    try:
+                        data = line.decode("utf-8")
+                        if data.startswith('{'):
+                            chunk = json.loads(data)
+                            if 'response' in chunk:
+                                output += chunk['response']
+                            if chunk.get('done'):
+                                final = chunk
+                            elif until is not None and '\n' in chunk.get('response', '') and until(output):
+                                # Leaving the with block closes the connection mid-stream
+                                final = {'done_reason': 'early_stop'}
+                                break
+                    except Exception as e:
+                        print(f"[DEBUG] JSON parse error: {e} for data: {line!r}")
+                        continue
+            ok = True
+        finally:
+            self.stats.record("/api/generate", time.perf_counter() - start, ok)
+        metrics = self._local.metrics = self.prompt_eval.observe(model, prompt, final)
+        self.stats.record_generation("/api/generate", metrics, stage)
+        if metrics['done_reason'] == 'length':
+            print(f"[WARN] {stage or 'generation'} output hit num_predict={max_new_tokens} and was cut off")
+        output = output.strip()
+        if self.cache is not None:
+            self.cache.put(model, prompt, temperature, max_new_tokens, output, seed, sample)
+        return output
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncOllamaClient:
+    # asyncio counterpart of OllamaClient built on httpx.AsyncClient, for running the
+    # pipeline inside an existing event loop. Use as "async with AsyncOllamaClient() as client".
+    def __init__(self, base_url=OLLAMA_URL, pool_size=DEFAULT_POOL_SIZE,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT, cache=None,
+                 embed_cache=None, keep_alive=DEFAULT_KEEP_ALIVE):
+        import httpx
+        self._httpx = httpx
+        self.base_url = base_url.rstrip("/")
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+        )
+        self.stats = LatencyStats()
+        # Optional LLMCache; generations it may serve never reach the server
+        self.cache = cache
+        # Optional EmbeddingStore; cached texts are not re-embedded
+        self.embed_cache = embed_cache
+        self.supports_embed_array = None
+        self.prompt_eval = PromptEvalTracker()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    def get_stats(self):
+        return self.stats.snapshot()
+
+    def print_stats(self):
+        self.stats.print()
+        if self.cache is not None:
+            self.cache.print_stats()
+        if self.embed_cache is not None:
+            self.embed_cache.print_stats()
+
+    async def post(self, path, payload, timeout=None):
+        start = time.perf_counter()
+        ok = False
+        try:
+            resp = await self.client.post(path, json=payload, timeout=timeout or self._httpx.USE_CLIENT_DEFAULT)
+            resp.raise_for_status()
+            data = resp.json()
+            ok = True
+            return data
+        finally:
+            self.stats.record(path, time.perf_counter() - start, ok)
+
+    async def embed_one(self, text, model=DEFAULT_MODEL):
+        data = await self.post("/api/embeddings", {"model": model, "prompt": text}, timeout=60)
+        if "embedding" not in data:
+            print(f"[ERROR] Ollama embedding response missing 'embedding' key. Full response: {data}")
+            return None
+        return data["embedding"]
+
+    async def embed(self, texts, model=DEFAULT_MODEL, batch_size=DEFAULT_EMBED_BATCH_SIZE):
+        # Same embedding-store, chunking and fallback rules as OllamaClient.embed
+        if self.embed_cache is None:
+            return await self._embed_uncached(texts, model, batch_size)
+        vectors, missing = self.embed_cache.lookup(model, texts)
+        if not missing:
+            return vectors
+        fresh = await self._embed_uncached([texts[i] for i in missing], model, batch_size)
+        return self.embed_cache.fill(model, texts, vectors, missing, fresh)
+
+    async def _embed_uncached(self, texts, model, batch_size):
+        if batch_size <= 1:
+            return [await self.embed_one(t, model=model) for t in texts]
+        vectors = []
+        for i in range(0, len(texts), batch_size):
+            chunk = list(texts[i:i + batch_size])
+            if self.supports_embed_array is not False:
+                try:
+                    data = await self.post("/api/embed", {"model": model, "input": chunk})
+                    embs = data.get("embeddings")
+                    if isinstance(embs, list) and len(embs) == len(chunk):
+                        self.supports_embed_array = True
+                        vectors.extend(embs)
+                        continue
+                    print(f"[WARN] /api/embed returned {len(embs) if isinstance(embs, list) else 'no'} embeddings "
+                          f"for {len(chunk)} inputs. Falling back to per-text embeddings for this chunk.")
+                except self._httpx.HTTPStatusError as e:
+                    if e.response.status_code not in (404, 405):
+                        raise
+                    print("[WARN] Ollama server does not support array input on /api/embed. "
+                          "Falling back to per-text /api/embeddings.")
+                    self.supports_embed_array = False
+            for t in chunk:
+                vectors.append(await self.embed_one(t, model=model))
+        return vectors
+
+    async def generate(self, prompt, model=DEFAULT_MODEL, max_new_tokens=128, temperature=0.7, seed=None, sample=None,
+                       keep_alive=None, context=None, stage=None, stop=None, until=None):
+        if self.cache is not None:
+            cached = self.cache.get(model, prompt, temperature, max_new_tokens, seed, sample)
+            if cached is not None:
+                return cached
+        payload = build_generate_payload(prompt, model, max_new_tokens, temperature, seed,
+                                         self.keep_alive if keep_alive is None else keep_alive, context, stop)
+        start = time.perf_counter()
+        ok = False
+        final = {}
+        try:
+            async with self.client.stream("POST", "/api/generate", json=payload) as resp:
+                resp.raise_for_status()
+                output = ""
+                async for line in resp.aiter_lines():
+                    if not line or not line.startswith('{'):
+                        continue
+                    try:
+                        chunk = json.loads(line)
+                    except Exception as e:
+                        print(f"[DEBUG] JSON parse error: {e} for data: {line!r}")
+                        continue
+                    if 'response' in chunk:
+                        output += chunk['response']
+                    if chunk.get('done'):
+                        final = chunk
+                    elif until is not None and '\n' in chunk.get('response', '') and until(output):
+                        final = {'done_reason': 'early_stop'}
+                        break
+            ok = True
+        finally:
+            self.stats.record("/api/generate", time.perf_counter() - start, ok)
+        metrics = self.prompt_eval.observe(model, prompt, final)
+        self.stats.record_generation("/api/generate", metrics, stage)
+        if metrics['done_reason'] == 'length':
+            print(f"[WARN] {stage or 'generation'} output hit num_predict={max_new_tokens} and was cut off")
+        output = output.strip()
+        if self.cache is not None:
+            self.cache.put(model, prompt, temperature, max_new_tokens, output, seed, sample)
+        return output
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    # Process-wide client, created lazily with the env/default settings
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OllamaClient(cache=open_cache(), embed_cache=open_embed_cache())
+        return _client
+
+
+def configure_client(**kwargs):
+    # Replace the process-wide client (e.g. from CLI flags: pool_size, read_timeout, ...)
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = OllamaClient(**kwargs)
+        return _client
+
+
+def open_cache(path=DEFAULT_CACHE_PATH, policy=DEFAULT_CACHE_POLICY, max_entries=DEFAULT_CACHE_MAX_ENTRIES):
+    # LLMCache for the given settings, or None when caching is disabled
+    if not path or policy == "off":
+        return None
+    return LLMCache(path, policy=policy, max_entries=max_entries)
+
+
+def open_embed_cache(directory=DEFAULT_EMBED_CACHE_DIR, capacity=DEFAULT_EMBED_CACHE_CAPACITY):
+    # EmbeddingStore for the given directory, or None when it is not configured
+    if not directory:
+        return None
+    return EmbeddingStore(directory, capacity=capacity)
+
+
+def add_client_args(parser):
+    # Shared CLI flags for the Ollama client; pair with configure_client_from_args
+    parser.add_argument('--pool_size', type=int, default=DEFAULT_POOL_SIZE, help='Max keep-alive connections to the Ollama server')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_READ_TIMEOUT, help='Read timeout (seconds) per Ollama call')
+    parser.add_argument('--cache', type=str, default=DEFAULT_CACHE_PATH, help='SQLite file for the LLM response cache (empty disables it)')
+    parser.add_argument('--cache_policy', choices=CACHE_POLICIES, default=DEFAULT_CACHE_POLICY,
+                        help='When cached generations may be reused: off, deterministic (temperature 0 or fixed seed), always')
+    parser.add_argument('--cache_max_entries', type=int, default=DEFAULT_CACHE_MAX_ENTRIES, help='LRU bound for the response cache')
+    parser.add_argument('--embed_cache', type=str, default=DEFAULT_EMBED_CACHE_DIR, help='Directory for the shared memory-mapped embedding cache (empty disables it)')
+    parser.add_argument('--keep_alive', type=str, default=DEFAULT_KEEP_ALIVE, help='How long Ollama keeps the model and its prompt KV cache loaded between calls (e.g. 30m; empty for the server default)')
+    parser.add_argument('--num_predict_ratios', type=parse_ratios, default=None,
+                        help='Output-token budget per source token by stage, e.g. translate=2,backtranslate=1.5,fuse=1.5 '
+                             f'(default {",".join(f"{k}={v:g}" for k, v in DEFAULT_NUM_PREDICT_RATIOS.items())})')
+    parser.add_argument('--num_predict_margin', type=int, default=DEFAULT_NUM_PREDICT_MARGIN, help='Tokens added to every stage budget')
+    parser.add_argument('--num_predict_max', type=int, default=DEFAULT_NUM_PREDICT_MAX, help='Upper bound on a single output budget')
+    parser.add_argument('--embed_cache_capacity', type=int, default=DEFAULT_EMBED_CACHE_CAPACITY, help='Vectors kept per model before LRU eviction')
+
+
+def configure_client_from_args(args, min_pool_size=1):
+    configure_token_budget(ratios=args.num_predict_ratios, margin=args.num_predict_margin,
+                           max_tokens=args.num_predict_max)
+    cache = open_cache(args.cache, policy=args.cache_policy, max_entries=args.cache_max_entries)
+    embed_cache = open_embed_cache(args.embed_cache, capacity=args.embed_cache_capacity)
+    return configure_client(pool_size=max(args.pool_size, min_pool_size), read_timeout=args.timeout,
+                            cache=cache, embed_cache=embed_cache, keep_alive=args.keep_alive)
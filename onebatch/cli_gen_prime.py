@@ -1,12 +1,21 @@
 
 
 import argparse
+import asyncio
 import time
 import sys
 import re
 import json
 import csv
 from ollama_setup import load_qwen3_generation, load_qwen3_reranker, load_qwen3_embeddings
+from ollama_client import AsyncOllamaClient
+from rerank import rerank
+from candidates import group_candidates, expand_group_scores
+from corpus import iter_corpus, stream_translations, DEFAULT_BATCH_WORKERS
+from translation_memory import open_translation_memory
+from multi_sample import parse_numbered_candidates, collect_samples, DEFAULT_SAMPLES_PER_CALL
+from token_budget import num_predict
+from stop_rules import rules_for_stage
 import requests
 import os
 
@@ -20,43 +29,41 @@ OLLAMA_MODELS = {
 }
 EMBED_PIPE = load_qwen3_embeddings(model_name=EMBED_MODEL)
 RERANKER_PIPE = load_qwen3_reranker(model_name=EMBED_MODEL)
+# Only the 14 best-scoring runs are ever fused, so selection stops there
+FUSION_POOL = 14
+# Finished outputs per (model, source sentence); set TRANSLATION_MEMORY_PATH to enable
+TRANSLATION_MEMORY = open_translation_memory(embed=RERANKER_PIPE, embed_model=EMBED_MODEL)
 
 def get_available_models():
     return list(OLLAMA_MODELS.keys())
 
-def call_ollama_generation(prompt, model_name, max_new_tokens=128):
+def call_ollama_generation(prompt, model_name, max_new_tokens=None, sample=None, stage=None, source=None, stop_early=True):
+    # Without max_new_tokens the budget comes from token_budget for the stage and its source text;
+    # with stop_early the stage's stop rules cut trailing commentary off the stream
     gen_pipe = OLLAMA_MODELS[model_name]["gen"]
-    out = gen_pipe(prompt, max_new_tokens=max_new_tokens)
+    if max_new_tokens is None:
+        max_new_tokens = num_predict(stage, source)
+    stop, until = rules_for_stage(stage) if stop_early else (None, None)
+    out = gen_pipe(prompt, max_new_tokens=max_new_tokens, sample=sample, stage=stage, stop=stop, until=until)
     raw = out[0]['generated_text'] if isinstance(out, list) else out['generated_text']
     return raw
 
 def call_ollama_embedding(sentences, model_name=None):
     return EMBED_PIPE.encode(sentences)
 
-def call_ollama_reranker(query, docs, model_name=None):
-    import numpy as np
+def call_ollama_reranker(query, docs, model_name=None, k=None):
     if not docs:
         return []
     texts = [query] + docs
     embs = RERANKER_PIPE(texts)
-    # Only keep docs with valid embeddings
-    valid_indices = [i for i, e in enumerate(embs[1:]) if e and len(e) == len(embs[0])]
+    return score_embeddings(embs, k)
+
+def score_embeddings(embs, k=None):
+    # embs is [query_emb] + doc_embs; returns (doc_idx, cosine_sim) best first for the top k valid docs
     if not embs or len(embs[0]) == 0:
         print(f"[ERROR] Query embedding is empty for embedding model {EMBED_MODEL}. Skipping reranking.")
         return []
-    if not valid_indices:
-        print(f"[ERROR] All doc embeddings are empty or mismatched for embedding model {EMBED_MODEL}. Skipping reranking.")
-        return []
-    q_emb = np.array(embs[0])
-    sims = []
-    for i, e in enumerate(embs[1:]):
-        if e and len(e) == len(q_emb):
-            d = np.array(e)
-            sim = float(np.dot(q_emb, d) / (np.linalg.norm(q_emb) * np.linalg.norm(d) + 1e-8))
-            sims.append((i, sim))
-        else:
-            print(f"[WARN] Skipping doc {i} due to empty or mismatched embedding.")
-    return sims
+    return rerank(embs[0], embs[1:], k)
 
 def parse_translation_output(output):
     # Extract only Japanese sentences, remove commentary and non-Japanese explanations
@@ -74,6 +81,10 @@ def parse_translation_output(output):
             jp_lines.append(l)
     return {'japanese': ' '.join(jp_lines).strip()}
 
+def parse_translation_candidates(output):
+    # Numbered alternatives from a multi-sample reply (parse_translation_output skips numbered lines)
+    return parse_numbered_candidates(output, keep=lambda l: bool(parse_translation_output(l)['japanese']))
+
 def parse_backtranslation_output(output):
     # Remove commentary, explanations, and only keep main English sentences
     lines = output.splitlines()
@@ -123,82 +134,41 @@ def update_translation_histogram(all_results):
 
 
 
-def run_translation(model_name, text, runs=14, delay=0):
-    all_results = []
-    prime_translation = {
-        'input_text': text,
-        'model': model_name,
-        'japanese': "",
-        'back_english': ""
-    }
+def translate_prompt(text):
+    return f"Translate all of the following English sentences to Japanese, preserving each sentence, as if you were speaking in a generally polite, but not overly formal, manner:\n\n{text}"
 
-    # 1. Generate translations using Ollama generation (31 runs)
-    for i in range(31):
-        print(f"[INFO] Run {i+1} for model {model_name}...")
-        jp_raw = call_ollama_generation(f"Translate all of the following English sentences to Japanese, preserving each sentence, as if you were speaking in a generally polite, but not overly formal, manner:\n\n{text}", model_name)
-        parsed_jp = parse_translation_output(jp_raw)
-        back_en_raw = call_ollama_generation(f"Translate this to English:\n\n{parsed_jp['japanese']}", model_name)
-        parsed_en = parse_backtranslation_output(back_en_raw)
+def multi_translate_prompt(text, n):
+    return f"Give {n} different alternative Japanese translations of all of the following English sentences, preserving each sentence, as if you were speaking in a generally polite, but not overly formal, manner. Number them 1. to {n}., one translation per number, and output nothing else:\n\n{text}"
 
-        result = {
-            'run': i+1,
-            'input_text': text,
-            'model': model_name,
-            'japanese': parsed_jp['japanese'],
-            'back_english': parsed_en['english']
-        }
-        all_results.append(result)
+def backtranslate_prompt(japanese):
+    return f"Translate this to English:\n\n{japanese}"
 
-    # 2. Compute semantic similarity using Ollama reranker or embeddings
-    back_english_list = [r['back_english'] for r in all_results]
-    sims = call_ollama_reranker(text, back_english_list, model_name)
-    # sims is a list of (idx, sim) for valid runs only
-    if not sims:
-        print(f"[WARN] No valid embeddings for reranking. Skipping reranking and fusion for this run.")
-        return {
-            'prime_translation': prime_translation,
-            'all_runs': all_results,
-            'translation_histogram': {},
-            'translation_occurrences': {}
-        }
-    # Only keep valid runs
-    scored = [(sim, all_results[idx]) for idx, sim in sims]
-    scored.sort(reverse=True, key=lambda x: x[0])
+def final_backtranslate_prompt(japanese):
+    return f"Translate this to English. Only output the English translation, no commentary or explanation:\n\n{japanese}"
 
-    # Top 3 and 4th-14th for fusion
-    top3 = [r['japanese'] for _, r in scored[:3]]
-    fourth_to_14th = [r['japanese'] for _, r in scored[1:14]]
+def fuse_prompt(jp_list, start=1):
+    prompt = """Fuse these Japanese sentences into one natural, fluent Japanese translation that preserves all the original meaning, is not overly formal, and is suitable for a general audience. Only output the Japanese translation, no commentary.\n\n"""
+    for idx, jp in enumerate(jp_list):
+        prompt += f"{idx+start}. {jp}\n"
+    return prompt
 
-    # LLM Fusion of top 3
-    fuse_prompt_top3 = """Fuse these Japanese sentences into one natural, fluent Japanese translation that preserves all the original meaning, is not overly formal, and is suitable for a general audience. Only output the Japanese translation, no commentary.\n\n"""
-    for idx, jp in enumerate(top3):
-        fuse_prompt_top3 += f"{idx+1}. {jp}\n"
-    fused_top3 = call_ollama_generation(fuse_prompt_top3, model_name)
-    fused_top3 = parse_translation_output(fused_top3)['japanese']
+def final_fuse_prompt(fused_top3, fused_4_14):
+    return """Fuse these two Japanese translations into one final, natural, fluent Japanese translation that preserves all the original meaning, is not overly formal, and is suitable for a general audience. Only output the Japanese translation, no commentary.\n\n1. """ + fused_top3 + "\n2. " + fused_4_14 + "\n"
 
-    # LLM Fusion of 4th-14th
-    fuse_prompt_4_14 = """Fuse these Japanese sentences into one natural, fluent Japanese translation that preserves all the original meaning, is not overly formal, and is suitable for a general audience. Only output the Japanese translation, no commentary.\n\n"""
-    for idx, jp in enumerate(fourth_to_14th):
-        fuse_prompt_4_14 += f"{idx+4}. {jp}\n"
-    fused_4_14 = call_ollama_generation(fuse_prompt_4_14, model_name)
-    fused_4_14 = parse_translation_output(fused_4_14)['japanese']
-
-    # Final LLM Fusion of the two fusions
-    final_fuse_prompt = """Fuse these two Japanese translations into one final, natural, fluent Japanese translation that preserves all the original meaning, is not overly formal, and is suitable for a general audience. Only output the Japanese translation, no commentary.\n\n1. """ + fused_top3 + "\n2. " + fused_4_14 + "\n"
-    final_fused_japanese = call_ollama_generation(final_fuse_prompt, model_name)
-    final_fused_japanese = parse_translation_output(final_fused_japanese)['japanese']
-
-    # Backtranslate the final fused Japanese to English using the LLM
-    final_fused_back_en = call_ollama_generation(f"Translate this to English. Only output the English translation, no commentary or explanation:\n\n{final_fused_japanese}", model_name)
-    final_fused_back_en = parse_backtranslation_output(final_fused_back_en)['english']
+def select_for_fusion(all_results, sims):
+    # sims is already best first (see score_embeddings); top 3 and 4th-14th for fusion
+    scored = [(sim, all_results[idx]) for idx, sim in sims]
+    top3 = [r['japanese'] for _, r in scored[:3]]
+    fourth_to_14th = [r['japanese'] for _, r in scored[1:14]]
+    return scored, top3, fourth_to_14th
 
-    prime_translation['japanese'] = final_fused_japanese
-    prime_translation['back_english'] = final_fused_back_en
-    prime_translation['top3_fused'] = fused_top3
-    prime_translation['4_14_fused'] = fused_4_14
-    prime_translation['top_japanese'] = top3
-    prime_translation['top_back_english'] = [r['back_english'] for _, r in scored[:3]]
+def apply_backtranslation(all_results, group, back_english):
+    # Fan one group's backtranslation out to every run that produced the same Japanese
+    for i in group['indices']:
+        all_results[i]['back_english'] = back_english
+        all_results[i]['multiplicity'] = group['multiplicity']
 
+def build_translation_output(prime_translation, all_results, groups=None):
     # Update histogram after all runs
     translation_histogram = {
         "japanese": {},
@@ -229,7 +199,7 @@ def run_translation(model_name, text, runs=14, delay=0):
             jp_to_en_hist[jp][back_en] = jp_to_en_hist[jp].get(back_en, 0) + 1
 
     # Return all results for this model
-    return {
+    output = {
         'prime_translation': prime_translation,
         'all_runs': all_results,
         'translation_histogram': translation_histogram,
@@ -238,6 +208,219 @@ def run_translation(model_name, text, runs=14, delay=0):
             'japanese_to_english': jp_to_en_hist
         }
     }
+    if groups is not None:
+        # Distinct candidates with their multiplicity (the weight each carried into fusion)
+        output['unique_candidates'] = [{
+            'japanese': all_results[g['indices'][0]]['japanese'],
+            'back_english': all_results[g['indices'][0]]['back_english'],
+            'multiplicity': g['multiplicity'],
+            'runs': [i+1 for i in g['indices']]
+        } for g in groups]
+    return output
+
+def no_fusion_output(prime_translation, all_results):
+    print(f"[WARN] No valid embeddings for reranking. Skipping reranking and fusion for this run.")
+    return {
+        'prime_translation': prime_translation,
+        'all_runs': all_results,
+        'translation_histogram': {},
+        'translation_occurrences': {}
+    }
+
+def translation_memory_hit(model_name, text):
+    # A stored output for this (or a near-identical) sentence, tagged with how it matched
+    if TRANSLATION_MEMORY is None:
+        return None
+    value, match = TRANSLATION_MEMORY.lookup(f"onebatch:{model_name}", text)
+    if value is None:
+        return None
+    print(f"[INFO] Translation memory {match['match']} match ({match['similarity']:.3f}) for: {text}")
+    return {**value, 'translation_memory': match}
+
+def forward_candidates(model_name, text, samples_per_call=1):
+    # The 31 forward translations, `samples_per_call` per request (see multi_sample.py)
+    def multi(call_idx, k):
+        raw = call_ollama_generation(multi_translate_prompt(text, k), model_name,
+                                     max_new_tokens=num_predict('translate', text, n=k),
+                                     sample=f"multi{k}-{call_idx+1}", stage='translate', stop_early=False)
+        return parse_translation_candidates(raw)
+
+    def single(i):
+        print(f"[INFO] Run {i+1} for model {model_name}...")
+        return parse_translation_output(call_ollama_generation(translate_prompt(text), model_name, sample=i+1,
+                                                           stage='translate', source=text))['japanese']
+
+    return collect_samples(31, samples_per_call, multi, single)
+
+def run_translation(model_name, text, runs=14, delay=0, samples_per_call=DEFAULT_SAMPLES_PER_CALL):
+    remembered = translation_memory_hit(model_name, text)
+    if remembered is not None:
+        return remembered
+    all_results = []
+    prime_translation = {
+        'input_text': text,
+        'model': model_name,
+        'japanese': "",
+        'back_english': ""
+    }
+
+    # 1. Generate translations using Ollama generation (31 runs)
+    candidates, sampling = forward_candidates(model_name, text, samples_per_call)
+    for i, japanese in enumerate(candidates):
+        result = {
+            'run': i+1,
+            'input_text': text,
+            'model': model_name,
+            'japanese': japanese,
+            'back_english': ''
+        }
+        all_results.append(result)
+
+    # 2. Backtranslate each distinct Japanese output once and fan it back out to its runs
+    groups = group_candidates([r['japanese'] for r in all_results])
+    for g in groups:
+        first = g['indices'][0]
+        back_en_raw = call_ollama_generation(backtranslate_prompt(all_results[first]['japanese']), model_name, sample=first+1,
+                                             stage='backtranslate', source=all_results[first]['japanese'])
+        apply_backtranslation(all_results, g, parse_backtranslation_output(back_en_raw)['english'])
+
+    # 3. Compute semantic similarity of the distinct backtranslations using Ollama embeddings
+    group_sims = call_ollama_reranker(text, [all_results[g['indices'][0]]['back_english'] for g in groups], model_name)
+    # sims is a list of (run_idx, sim) for valid runs only, best first
+    sims = expand_group_scores(groups, group_sims, k=FUSION_POOL)
+    if not sims:
+        return {**no_fusion_output(prime_translation, all_results), 'sampling': sampling}
+    scored, top3, fourth_to_14th = select_for_fusion(all_results, sims)
+
+    # LLM Fusion of top 3
+    fused_top3 = call_ollama_generation(fuse_prompt(top3, 1), model_name, stage='fuse', source=top3)
+    fused_top3 = parse_translation_output(fused_top3)['japanese']
+
+    # LLM Fusion of 4th-14th
+    fused_4_14 = call_ollama_generation(fuse_prompt(fourth_to_14th, 4), model_name, stage='fuse', source=fourth_to_14th)
+    fused_4_14 = parse_translation_output(fused_4_14)['japanese']
+
+    # Final LLM Fusion of the two fusions
+    final_fused_japanese = call_ollama_generation(final_fuse_prompt(fused_top3, fused_4_14), model_name,
+                                                  stage='fuse', source=[fused_top3, fused_4_14])
+    final_fused_japanese = parse_translation_output(final_fused_japanese)['japanese']
+
+    # Backtranslate the final fused Japanese to English using the LLM
+    final_fused_back_en = call_ollama_generation(final_backtranslate_prompt(final_fused_japanese), model_name,
+                                                 stage='backtranslate', source=final_fused_japanese)
+    final_fused_back_en = parse_backtranslation_output(final_fused_back_en)['english']
+
+    prime_translation['japanese'] = final_fused_japanese
+    prime_translation['back_english'] = final_fused_back_en
+    prime_translation['top3_fused'] = fused_top3
+    prime_translation['4_14_fused'] = fused_4_14
+    prime_translation['top_japanese'] = top3
+    prime_translation['top_back_english'] = [r['back_english'] for _, r in scored[:3]]
+
+    output = build_translation_output(prime_translation, all_results, groups)
+    # Calls made for the forward candidates and how many distinct ones they produced
+    output['sampling'] = sampling
+    if TRANSLATION_MEMORY is not None and final_fused_japanese:
+        TRANSLATION_MEMORY.store(f"onebatch:{model_name}", text, output)
+    return output
+
+# --- Async pipeline ---
+# Same 31 -> rerank -> fuse pipeline as run_translation, on AsyncOllamaClient so it can run
+# inside an existing event loop without a thread per request. The 31 runs are bounded by
+# `concurrency`; the top-3 and 4th-14th fusions run concurrently.
+
+async def call_ollama_generation_async(client, prompt, model_name, max_new_tokens=None, sample=None, stage=None, source=None):
+    if max_new_tokens is None:
+        max_new_tokens = num_predict(stage, source)
+    stop, until = rules_for_stage(stage)
+    try:
+        return await client.generate(prompt, model=model_name, max_new_tokens=max_new_tokens, sample=sample, stage=stage,
+                                     stop=stop, until=until)
+    except Exception as e:
+        print(f"[ERROR] Ollama generation failed: {e}")
+        return "[Ollama error: no output]"
+
+async def call_ollama_reranker_async(client, query, docs):
+    # All valid docs, best first
+    if not docs:
+        return []
+    try:
+        embs = await client.embed([query] + docs, model=EMBED_MODEL)
+    except Exception as e:
+        print(f"[ERROR] Ollama embedding failed: {e}")
+        return []
+    return score_embeddings([e if e else [0.0]*1024 for e in embs])
+
+async def run_translation_async(model_name, text, runs=14, delay=0, client=None, concurrency=8):
+    if client is None:
+        async with AsyncOllamaClient(pool_size=concurrency) as own_client:
+            return await run_translation_async(model_name, text, runs, delay, client=own_client, concurrency=concurrency)
+
+    prime_translation = {
+        'input_text': text,
+        'model': model_name,
+        'japanese': "",
+        'back_english': ""
+    }
+    sem = asyncio.Semaphore(concurrency)
+
+    async def forward(i):
+        async with sem:
+            print(f"[INFO] Run {i+1} for model {model_name}...")
+            jp_raw = await call_ollama_generation_async(client, translate_prompt(text), model_name, sample=i+1,
+                                                        stage='translate', source=text)
+        return {
+            'run': i+1,
+            'input_text': text,
+            'model': model_name,
+            'japanese': parse_translation_output(jp_raw)['japanese'],
+            'back_english': ''
+        }
+
+    async def backtranslate(g):
+        first = g['indices'][0]
+        async with sem:
+            back_en_raw = await call_ollama_generation_async(client, backtranslate_prompt(all_results[first]['japanese']), model_name,
+                                                             sample=first+1, stage='backtranslate', source=all_results[first]['japanese'])
+        apply_backtranslation(all_results, g, parse_backtranslation_output(back_en_raw)['english'])
+
+    # 1. 31 forward translations (gather keeps run order)
+    all_results = list(await asyncio.gather(*(forward(i) for i in range(31))))
+
+    # 2. One backtranslation per distinct Japanese output
+    groups = group_candidates([r['japanese'] for r in all_results])
+    await asyncio.gather(*(backtranslate(g) for g in groups))
+
+    # 3. Rerank the distinct backtranslations; duplicates inherit their group's score
+    group_sims = await call_ollama_reranker_async(client, text, [all_results[g['indices'][0]]['back_english'] for g in groups])
+    sims = expand_group_scores(groups, group_sims, k=FUSION_POOL)
+    if not sims:
+        return no_fusion_output(prime_translation, all_results)
+    scored, top3, fourth_to_14th = select_for_fusion(all_results, sims)
+
+    # 4. The two first-level fusions are independent
+    fused_top3, fused_4_14 = await asyncio.gather(
+        call_ollama_generation_async(client, fuse_prompt(top3, 1), model_name, stage='fuse', source=top3),
+        call_ollama_generation_async(client, fuse_prompt(fourth_to_14th, 4), model_name, stage='fuse', source=fourth_to_14th),
+    )
+    fused_top3 = parse_translation_output(fused_top3)['japanese']
+    fused_4_14 = parse_translation_output(fused_4_14)['japanese']
+
+    final_fused_japanese = await call_ollama_generation_async(client, final_fuse_prompt(fused_top3, fused_4_14), model_name,
+                                                              stage='fuse', source=[fused_top3, fused_4_14])
+    final_fused_japanese = parse_translation_output(final_fused_japanese)['japanese']
+    final_fused_back_en = await call_ollama_generation_async(client, final_backtranslate_prompt(final_fused_japanese), model_name,
+                                                             stage='backtranslate', source=final_fused_japanese)
+    final_fused_back_en = parse_backtranslation_output(final_fused_back_en)['english']
+
+    prime_translation['japanese'] = final_fused_japanese
+    prime_translation['back_english'] = final_fused_back_en
+    prime_translation['top3_fused'] = fused_top3
+    prime_translation['4_14_fused'] = fused_4_14
+    prime_translation['top_japanese'] = top3
+    prime_translation['top_back_english'] = [r['back_english'] for _, r in scored[:3]]
+
+    return build_translation_output(prime_translation, all_results, groups)
 
 # CLI entry point
 
@@ -254,25 +437,44 @@ def menu():
     print("2. Use default text (Programming and Food)")
     print("3. Read from a .txt file")
     print("4. Read from a .csv file")
-    print("5. Read from a .json file")
+    print("5. Read from a .json or .jsonl file")
     print("0. Exit")
 
     choice = input("Enter your choice: ")
     return choice
 
-def process_txt_file(file_path, model_name, runs):
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-        for line in lines:
-            text = line.strip()
-            if text:
-                print(f"Processing: {text}")
-                run_translation(model_name, text, runs)
-    except FileNotFoundError:
+def default_batch_output(file_path):
+    return os.path.join('onebatch', os.path.splitext(os.path.basename(file_path))[0] + '_translations.jsonl')
+
+def process_corpus_file(file_path, models, runs, output_path=None, workers=DEFAULT_BATCH_WORKERS, text_field=None):
+    # Streams a .txt/.csv/.json/.jsonl corpus through run_translation for every model,
+    # `workers` sentences at a time, one JSONL line per sentence ({'models': [...]} as in
+    # latest_translation.json). Returns the output path, or None if the input is missing.
+    if not os.path.exists(file_path):
         print(f"[ERROR] File not found: {file_path}")
+        return None
+    output_path = output_path or default_batch_output(file_path)
+
+    def translate(text):
+        print(f"Processing: {text}")
+        return {'models': [{'model': model, 'result': run_translation(model, text, runs)} for model in models]}
+
+    try:
+        stream_translations(iter_corpus(file_path, text_field), translate, output_path,
+                            header={'input': file_path, 'models': models}, workers=workers)
     except Exception as e:
         print(f"[ERROR] An error occurred while processing the file: {e}")
+    return output_path
+
+def process_txt_file(file_path, model_name, runs):
+    return process_corpus_file(file_path, [model_name], runs)
+
+def prompt_corpus_file(kind, models):
+    file_path = input(f"Enter the path to the {kind} file: ").strip()
+    output_path = input(f"Output JSONL [{default_batch_output(file_path)}]: ").strip() or None
+    output_path = process_corpus_file(file_path, models, runs=14, output_path=output_path)
+    if output_path:
+        print(f"[INFO] Saved batch results to {output_path}")
 
 
 if __name__ == "__main__":
@@ -306,13 +508,11 @@ if __name__ == "__main__":
                 json.dump({'models': results}, jf, ensure_ascii=False, indent=2)
             print("[INFO] Saved all model results to onebatch/latest_translation.json")
         elif choice == "3":
-            file_path = input("Enter the path to the .txt file: ")
-            print("[INFO] Multi-model batch for .txt not implemented yet.")
-            # You could implement similar logic for batch files if needed
+            prompt_corpus_file(".txt", available_models)
         elif choice == "4":
-            print("[INFO] CSV processing is not implemented yet.")
+            prompt_corpus_file(".csv", available_models)
         elif choice == "5":
-            print("[INFO] JSON processing is not implemented yet.")
+            prompt_corpus_file(".json/.jsonl", available_models)
         elif choice == "0":
             print("Exiting program.")
             break
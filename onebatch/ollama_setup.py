@@ -1,35 +1,22 @@
 # --- OLLAMA GENERATION (Qwen2.7:7b-Instruct) ---
 
-import subprocess
-import requests
-import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from ollama_client import get_client, DEFAULT_EMBED_BATCH_SIZE
 
 # Use Ollama for all tasks (generation, embedding, reranking)
 OLLAMA_MODEL = "qwen2.5:7b-instruct"
+# Texts per /api/embed request; 1 disables batching
+EMBED_BATCH_SIZE = DEFAULT_EMBED_BATCH_SIZE
 
-def _ollama_generate(prompt, model=OLLAMA_MODEL, max_new_tokens=128, temperature=0.7):
-    url = "http://localhost:11434/api/generate"
-    payload = {
-        "model": model,
-        "prompt": prompt,
-        "options": {"num_predict": max_new_tokens, "temperature": temperature}
-    }
+def _ollama_generate(prompt, model=OLLAMA_MODEL, max_new_tokens=128, temperature=0.7, sample=None, stage=None,
+                     stop=None, until=None):
     try:
-        resp = requests.post(url, json=payload, timeout=120, stream=True)
-        output = ""
-        for line in resp.iter_lines():
-            if not line:
-                continue
-            try:
-                data = line.decode("utf-8")
-                if data.startswith('{'):
-                    chunk = json.loads(data)
-                    if 'response' in chunk:
-                        output += chunk['response']
-            except Exception as e:
-                print(f"[DEBUG] JSON parse error: {e} for data: {data}")
-                continue
-        return [{"generated_text": output.strip()}]
+        output = get_client().generate(prompt, model=model, max_new_tokens=max_new_tokens, temperature=temperature,
+                                       sample=sample, stage=stage, stop=stop, until=until)
+        return [{"generated_text": output}]
     except Exception as e:
         print(f"[ERROR] Ollama generation failed: {e}")
         return [{"generated_text": "[Ollama error: no output]"}]
@@ -37,55 +24,44 @@ def _ollama_generate(prompt, model=OLLAMA_MODEL, max_new_tokens=128, temperature
 def load_qwen3_generation(model_name=None, force_cpu=False):
     model = model_name if model_name is not None else OLLAMA_MODEL
     print(f"[INFO] Using Ollama for generation: {model}. Make sure Ollama is running and model is pulled.")
-    def generate(prompt, max_new_tokens=128, temperature=0.7, **kwargs):
-        return _ollama_generate(prompt, model=model, max_new_tokens=max_new_tokens, temperature=temperature)
+    def generate(prompt, max_new_tokens=128, temperature=0.7, sample=None, stage=None, stop=None, until=None, **kwargs):
+        return _ollama_generate(prompt, model=model, max_new_tokens=max_new_tokens, temperature=temperature, sample=sample,
+                                stage=stage, stop=stop, until=until)
     return generate
 
-def load_qwen3_reranker(model_name=None, force_cpu=False):
+def _ollama_embed(texts, model=OLLAMA_MODEL, batch_size=EMBED_BATCH_SIZE):
+    # Accepts a list of texts, returns list of embeddings (zero vector for failed texts).
+    # batch_size > 1 sends chunks to /api/embed; batch_size=1 keeps the old one-request-per-text path.
+    # Texts already in the shared embedding cache (OLLAMA_EMBED_CACHE_DIR) are not re-embedded.
+    try:
+        embs = get_client().embed(texts, model=model, batch_size=batch_size)
+        return [e if e else [0.0]*1024 for e in embs]
+    except Exception as e:
+        print(f"[ERROR] Ollama embedding failed: {e}. Retrying one text at a time.")
+    results = []
+    for t in texts:
+        try:
+            e = get_client().embed_one(t, model=model)
+            results.append(e if e else [0.0]*1024)
+        except Exception as e:
+            print(f"[ERROR] Ollama embedding failed: {e}")
+            results.append([0.0]*1024)
+    return results
+
+def load_qwen3_reranker(model_name=None, force_cpu=False, batch_size=EMBED_BATCH_SIZE):
     # Use Ollama for reranking: returns embeddings, use cosine similarity
     model = model_name if model_name is not None else OLLAMA_MODEL
     print(f"[INFO] Using Ollama for reranking/embeddings: {model}. Cosine similarity will be used.")
     def ollama_embed(texts):
-        # Accepts a list of texts, returns list of embeddings
-        url = "http://localhost:11434/api/embeddings"
-        results = []
-        for t in texts:
-            payload = {"model": model, "prompt": t}
-            try:
-                resp = requests.post(url, json=payload, timeout=60)
-                data = resp.json()
-                if "embedding" in data:
-                    results.append(data["embedding"])
-                else:
-                    print(f"[ERROR] Ollama embedding response missing 'embedding' key. Full response: {data}")
-                    results.append([0.0]*1024)
-            except Exception as e:
-                print(f"[ERROR] Ollama embedding failed: {e}")
-                results.append([0.0]*1024)
-        return results
+        return _ollama_embed(texts, model=model, batch_size=batch_size)
     return ollama_embed
 
-def load_qwen3_embeddings(model_name=None, force_cpu=False):
+def load_qwen3_embeddings(model_name=None, force_cpu=False, batch_size=EMBED_BATCH_SIZE):
     # Use Ollama for embeddings
     model = model_name if model_name is not None else OLLAMA_MODEL
     print(f"[INFO] Using Ollama for embeddings: {model}.")
     def ollama_embed(texts):
-        url = "http://localhost:11434/api/embeddings"
-        results = []
-        for t in texts:
-            payload = {"model": model, "prompt": t}
-            try:
-                resp = requests.post(url, json=payload, timeout=60)
-                data = resp.json()
-                if "embedding" in data:
-                    results.append(data["embedding"])
-                else:
-                    print(f"[ERROR] Ollama embedding response missing 'embedding' key. Full response: {data}")
-                    results.append([0.0]*1024)
-            except Exception as e:
-                print(f"[ERROR] Ollama embedding failed: {e}")
-                results.append([0.0]*1024)
-        return results
+        return _ollama_embed(texts, model=model, batch_size=batch_size)
     return ollama_embed
 
 if __name__ == "__main__":
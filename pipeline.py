@@ -0,0 +1,185 @@
+# Two-stage producer/consumer pipeline for translate -> backtranslate runs.
+# Stage 1 workers produce into a bounded queue that stage 2 workers drain, so a forward
+# translation can start while earlier runs are still being backtranslated. Each stage has
+# its own concurrency limit and throughput counters; results come back in run order.
+# run_round_robin schedules independent items from several lanes (e.g. temperatures) onto
+# one bounded worker pool, taking from each lane in turn.
+import queue
+import threading
+import time
+from collections import deque
+
+
+class StageMetrics:
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self._lock = threading.Lock()
+        self.items = 0
+        self.errors = 0
+        self.busy_s = 0.0
+        self.first_start = None
+        self.last_end = None
+
+    def record(self, start, end, ok=True):
+        with self._lock:
+            self.items += 1
+            if not ok:
+                self.errors += 1
+            self.busy_s += end - start
+            self.first_start = start if self.first_start is None else min(self.first_start, start)
+            self.last_end = end if self.last_end is None else max(self.last_end, end)
+
+    def snapshot(self):
+        with self._lock:
+            wall = (self.last_end - self.first_start) if self.items else 0.0
+            return {
+                'stage': self.name,
+                'workers': self.workers,
+                'items': self.items,
+                'errors': self.errors,
+                'wall_s': wall,
+                'busy_s': self.busy_s,
+                'mean_s': self.busy_s / self.items if self.items else 0.0,
+                'throughput_per_s': self.items / wall if wall > 0 else 0.0,
+                # Fraction of the stage's worker slots that were busy while it was active
+                'utilization': self.busy_s / (wall * self.workers) if wall > 0 else 0.0
+            }
+
+    def print(self):
+        s = self.snapshot()
+        print(f"[STATS] stage {s['stage']}: {s['items']} items, {s['workers']} workers, "
+              f"{s['throughput_per_s']:.2f} items/s, mean {s['mean_s']:.3f}s, utilization {s['utilization']:.0%}")
+
+
+def run_two_stage(n, first, second, first_workers=1, second_workers=1, queue_size=None,
+                  on_result=None, names=('translate', 'backtranslate')):
+    # first(i) -> value, second(i, value) -> result, for i in range(n).
+    # on_result(i, result) is called in index order as results become contiguous; returning
+    # True stops the pipeline (no new stage 1 work) and the results are cut after index i.
+    # Returns (results in index order, [stage 1 metrics, stage 2 metrics]).
+    first_workers = max(1, first_workers)
+    second_workers = max(1, second_workers)
+    handoff = queue.Queue(maxsize=queue_size or 2 * second_workers)
+    m1 = StageMetrics(names[0], first_workers)
+    m2 = StageMetrics(names[1], second_workers)
+    lock = threading.Lock()
+    stop = threading.Event()
+    state = {'next': 0, 'emitted': 0, 'stop_at': None}
+    results = {}
+    errors = []
+
+    def producer():
+        while not stop.is_set():
+            with lock:
+                i = state['next']
+                if i >= n:
+                    return
+                state['next'] += 1
+            start = time.perf_counter()
+            try:
+                value = first(i)
+            except Exception as e:
+                m1.record(start, time.perf_counter(), ok=False)
+                errors.append(e)
+                stop.set()
+                return
+            m1.record(start, time.perf_counter())
+            handoff.put((i, value))
+
+    def consumer():
+        while True:
+            item = handoff.get()
+            if item is None:
+                return
+            i, value = item
+            if errors or (state['stop_at'] is not None and i > state['stop_at']):
+                continue
+            start = time.perf_counter()
+            try:
+                result = second(i, value)
+            except Exception as e:
+                m2.record(start, time.perf_counter(), ok=False)
+                errors.append(e)
+                stop.set()
+                continue
+            m2.record(start, time.perf_counter())
+            with lock:
+                results[i] = result
+                try:
+                    while state['stop_at'] is None and state['emitted'] in results:
+                        j = state['emitted']
+                        state['emitted'] += 1
+                        if on_result is not None and on_result(j, results[j]):
+                            state['stop_at'] = j
+                            stop.set()
+                except Exception as e:
+                    errors.append(e)
+                    stop.set()
+
+    producers = [threading.Thread(target=producer, daemon=True) for _ in range(first_workers)]
+    consumers = [threading.Thread(target=consumer, daemon=True) for _ in range(second_workers)]
+    for t in producers + consumers:
+        t.start()
+    for t in producers:
+        t.join()
+    for _ in consumers:
+        handoff.put(None)
+    for t in consumers:
+        t.join()
+    if errors:
+        raise errors[0]
+    count = n if state['stop_at'] is None else state['stop_at'] + 1
+    return [results[i] for i in range(count)], [m1, m2]
+
+
+def run_round_robin(lanes, fn, workers=1, on_done=None):
+    # lanes is {key: [item, ...]}; fn(key, item) runs on a pool of `workers` threads that
+    # take one item from each non-empty lane in turn, so a long lane cannot starve the
+    # others and at most `workers` items are in flight. on_done(key, item, result) is
+    # called serially as items finish. Returns {key: StageMetrics} in lane order.
+    workers = max(1, workers)
+    pending = deque((key, deque(items)) for key, items in lanes.items() if items)
+    metrics = {key: StageMetrics(str(key), workers) for key in lanes}
+    lock = threading.Lock()
+    done_lock = threading.Lock()
+    stop = threading.Event()
+    errors = []
+
+    def next_item():
+        with lock:
+            if stop.is_set() or not pending:
+                return None
+            key, items = pending.popleft()
+            item = items.popleft()
+            if items:
+                pending.append((key, items))
+            return key, item
+
+    def worker():
+        while True:
+            job = next_item()
+            if job is None:
+                return
+            key, item = job
+            start = time.perf_counter()
+            try:
+                result = fn(key, item)
+            except Exception as e:
+                metrics[key].record(start, time.perf_counter(), ok=False)
+                errors.append(e)
+                stop.set()
+                return
+            metrics[key].record(start, time.perf_counter())
+            if on_done is not None:
+                with done_lock:
+                    on_done(key, item, result)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(workers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if errors:
+        raise errors[0]
+    return metrics
@@ -0,0 +1,61 @@
+# Vectorized cosine reranking shared by onebatch and the distributed aggregators.
+# Embeddings are stacked into one matrix and normalized once; one matrix-vector product
+# scores every candidate and argpartition picks the top k without sorting the full list.
+import numpy as np
+
+
+def embedding_matrix(embs, dim):
+    # (len(embs) x dim) float32 matrix plus a mask of rows that are usable: non-empty,
+    # the expected dimension and a non-zero norm (zero vectors are embedding-error placeholders)
+    n = len(embs)
+    matrix = np.zeros((n, dim), dtype=np.float32)
+    valid = np.zeros(n, dtype=bool)
+    for i, e in enumerate(embs):
+        if e is not None and len(e) == dim:
+            matrix[i] = e
+            valid[i] = True
+    norms = np.linalg.norm(matrix, axis=1)
+    valid &= norms > 0
+    return matrix, norms, valid
+
+
+def cosine_scores(query_emb, doc_embs):
+    # Cosine similarity of every doc to the query; invalid docs get -inf and valid[i] False
+    q = np.asarray(query_emb, dtype=np.float32)
+    q_norm = np.linalg.norm(q)
+    matrix, norms, valid = embedding_matrix(doc_embs, len(q))
+    scores = np.full(len(doc_embs), -np.inf, dtype=np.float32)
+    if q_norm == 0 or not valid.any():
+        return scores, np.zeros(len(doc_embs), dtype=bool)
+    scores[valid] = (matrix[valid] @ q) / (norms[valid] * q_norm)
+    return scores, valid
+
+
+def top_k(scores, valid, k=None):
+    # Indices of the k best valid scores, best first
+    n_valid = int(valid.sum())
+    k = n_valid if k is None else min(k, n_valid)
+    if k <= 0:
+        return np.array([], dtype=int)
+    if k < len(scores):
+        idx = np.argpartition(-scores, k - 1)[:k]
+    else:
+        idx = np.arange(len(scores))
+    idx = idx[valid[idx]]
+    # Stable order for ties: higher score first, then lower index
+    return idx[np.lexsort((idx, -scores[idx]))]
+
+
+def rerank(query_emb, doc_embs, k=None):
+    # [(doc_idx, sim), ...] best first for the top k valid docs (all valid docs if k is None)
+    if query_emb is None or len(query_emb) == 0:
+        print("[ERROR] Query embedding is empty. Skipping reranking.")
+        return []
+    scores, valid = cosine_scores(query_emb, doc_embs)
+    if not valid.any():
+        print("[ERROR] All doc embeddings are empty or mismatched. Skipping reranking.")
+        return []
+    skipped = np.flatnonzero(~valid)
+    if len(skipped):
+        print(f"[WARN] Skipping {len(skipped)} docs due to empty or mismatched embedding: {skipped.tolist()}")
+    return [(int(i), float(scores[i])) for i in top_k(scores, valid, k)]
@@ -0,0 +1,141 @@
+# Append-only JSONL result log used for per-run checkpoints.
+# Each run appends one line (O(1) per run, unlike rewriting the whole JSON file); fsync is
+# batched every `fsync_every` lines or `fsync_interval` seconds. The first line is a header
+# with the sweep metadata. Readers tolerate a torn last line from a crash mid-write.
+import json
+import os
+import threading
+import time
+
+
+class ResultLog:
+    def __init__(self, path, header=None, append=False, fsync_every=10, fsync_interval=2.0):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        log_dir = os.path.dirname(path)
+        if log_dir and not os.path.exists(log_dir):
+            os.makedirs(log_dir, exist_ok=True)
+        fresh = not append or not os.path.exists(path) or os.path.getsize(path) == 0
+        self._lock = threading.Lock()
+        if not fresh:
+            # Terminate a torn last line so the next record does not get glued onto it
+            with open(path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b'\n'
+        self._f = open(path, 'w' if fresh else 'a', encoding='utf-8')
+        if not fresh and torn:
+            self._f.write('\n')
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        if fresh:
+            self.append({'type': 'header', **(header or {})})
+
+    def append(self, record):
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            self._f.write(line)
+            self._f.flush()
+            self._pending += 1
+            if self._pending >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+
+    def _sync(self):
+        os.fsync(self._f.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            if self._f.closed:
+                return
+            self._f.flush()
+            self._sync()
+            self._f.close()
+
+    @staticmethod
+    def read(path):
+        # (header dict, [record, ...]); skips a partially written trailing line
+        header = {}
+        records = []
+        if not os.path.exists(path):
+            return header, records
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    print(f"[WARN] Skipping unreadable line in {path}: {line[:80]}")
+                    continue
+                if record.get('type') == 'header':
+                    header = record
+                else:
+                    records.append(record)
+        return header, records
+
+
+class SweepCheckpoint:
+    # Per-(temperature, run) progress for a sweep, persisted through a ResultLog:
+    #   forward - the Japanese output of a run whose backtranslation has not finished yet
+    #   result  - a finished run
+    #   batch   - a finished per-temperature summary (statsig merges)
+    # On --resume the log is replayed so only missing cells are scheduled and runs that
+    # stopped after the forward translation only need their backtranslation.
+    def __init__(self, log, records=()):
+        self.log = log
+        self.forwards = {}
+        self.results = {}
+        self.batches = {}
+        for r in records:
+            kind = r.get('type')
+            key = (r.get('temperature'), r.get('run'))
+            if kind == 'forward':
+                self.forwards[key] = r['japanese']
+            elif kind == 'result':
+                self.results[key] = r['result']
+            elif kind == 'batch':
+                self.batches[r['temperature']] = r['summary']
+
+    @classmethod
+    def open(cls, path, header, resume=False):
+        # Raises ValueError when resuming a log written for a different sweep
+        records = ()
+        if resume and os.path.exists(path):
+            old_header, records = ResultLog.read(path)
+            for k, v in header.items():
+                if k in old_header and old_header[k] != v:
+                    raise ValueError(f"Cannot resume {path}: it was written for {k}={old_header[k]!r}, not {v!r}")
+        return cls(ResultLog(path, header=header, append=resume), records)
+
+    def get_forward(self, temperature, run):
+        return self.forwards.get((temperature, run))
+
+    def get_result(self, temperature, run):
+        return self.results.get((temperature, run))
+
+    def get_batch(self, temperature):
+        return self.batches.get(temperature)
+
+    def missing_runs(self, temperature, runs):
+        return [run for run in runs if (temperature, run) not in self.results]
+
+    def results_for(self, temperature):
+        return {run: result for (t, run), result in self.results.items() if t == temperature}
+
+    def record_forward(self, temperature, run, japanese):
+        self.forwards[(temperature, run)] = japanese
+        self.log.append({'type': 'forward', 'temperature': temperature, 'run': run, 'japanese': japanese})
+
+    def record_result(self, temperature, run, result):
+        self.results[(temperature, run)] = result
+        self.log.append({'type': 'result', 'temperature': temperature, 'run': run, 'result': result})
+
+    def record_batch(self, temperature, summary):
+        self.batches[temperature] = summary
+        self.log.append({'type': 'batch', 'temperature': temperature, 'summary': summary})
+
+    def close(self):
+        self.log.close()
@@ -1,39 +1,101 @@
-import requests
 import re
 import json
+import math
 import argparse
 import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
 
-def should_stop_early(num_runs, min_runs=10, window=5):
-    # No early stopping for 31/14/3 workflow
-    return False
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from ollama_client import get_client, add_client_args, configure_client_from_args
+from candidates import normalize_candidate, group_candidates, CallOnce
+from pipeline import run_two_stage
+from result_log import SweepCheckpoint
+from allocation import AdaptiveAllocator
+from token_budget import num_predict
+from stop_rules import rules_for_stage
+from translation_memory import open_translation_memory, DEFAULT_TM_PATH, DEFAULT_TM_THRESHOLD
 
-def call_ollama_generation(prompt, model_name="qwen2.5:7b-instruct", max_new_tokens=128, temperature=0.5):
-    url = "http://localhost:11434/api/generate"
-    payload = {
-        "model": model_name,
-        "prompt": prompt,
-        "options": {"num_predict": max_new_tokens, "temperature": temperature}
-    }
+MODEL_NAME = "qwen2.5:7b-instruct"
+
+def top_k_frequent(results, k=3):
+    # Normalized keys of the k most frequent non-empty outputs, or None unless there are k
+    # distinct outputs that each occurred at least twice and the k-th is strictly ahead of
+    # the next (a selection of one-offs, of failed empty runs or decided by a tie is not a
+    # stable selection)
+    groups = group_candidates([r['japanese'] for r in results if r['japanese']])
+    ranked = sorted(groups, key=lambda g: g['multiplicity'], reverse=True)
+    top = ranked[:k]
+    if len(top) < k or top[-1]['multiplicity'] < 2:
+        return None
+    if len(ranked) > k and ranked[k]['multiplicity'] == top[-1]['multiplicity']:
+        return None
+    return frozenset(g['key'] for g in top)
+
+def share_lower_bound(count, n, z=1.645):
+    # One-sided Wilson score lower bound on a proportion (z=1.645: 95% confidence)
+    if n == 0:
+        return 0.0
+    p = count / n
+    centre = p + z * z / (2 * n)
+    spread = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n))
+    return (centre - spread) / (1 + z * z / n)
+
+def should_stop_early(results, min_runs=10, max_runs=31, window=5, mode_share=0.6, top_k=3, z=1.645):
+    # Sequential stopping rule, checked after each run (or wave of concurrent runs).
+    # Returns (stop, reason). Never stops before min_runs; always stops at max_runs.
+    # Converged when either
+    #   - one normalized Japanese output makes up >= mode_share of the non-empty runs with
+    #     confidence: the Wilson lower bound on its share must reach mode_share, so an even
+    #     split between a few outputs does not pass on a lucky early majority, or
+    #   - the top_k most frequent outputs, each seen at least twice, have been the same set
+    #     over the last `window` runs.
+    num_runs = len(results)
+    if num_runs >= max_runs:
+        return True, 'max_runs'
+    if num_runs < min_runs:
+        return False, None
+    groups = group_candidates([r['japanese'] for r in results if r['japanese']])
+    non_empty = sum(g['multiplicity'] for g in groups)
+    if non_empty and share_lower_bound(max(g['multiplicity'] for g in groups), non_empty, z) >= mode_share:
+        return True, 'mode_share'
+    if num_runs > window:
+        latest = top_k_frequent(results, top_k)
+        if latest is not None and all(top_k_frequent(results[:n], top_k) == latest
+                                      for n in range(num_runs - window, num_runs)):
+            return True, 'top_k_stable'
+    return False, None
+
+def call_ollama_generation(prompt, model_name=MODEL_NAME, max_new_tokens=None, temperature=0.5, sample=None,
+                           stage=None, source=None):
+    # Without max_new_tokens the budget comes from token_budget for the stage and its source text;
+    # the stage's stop rules cut trailing commentary off the stream
+    if max_new_tokens is None:
+        max_new_tokens = num_predict(stage, source)
+    stop, until = rules_for_stage(stage)
     try:
-        resp = requests.post(url, json=payload, timeout=120, stream=True)
-        output = ""
-        for line in resp.iter_lines():
-            if not line:
-                continue
-            try:
-                data = line.decode("utf-8")
-                if data.startswith('{'):
-                    chunk = json.loads(data)
-                    if 'response' in chunk:
-                        output += chunk['response']
-            except Exception:
-                continue
-        return output.strip()
+        return get_client().generate(prompt, model=model_name, max_new_tokens=max_new_tokens, temperature=temperature,
+                                     sample=sample, stage=stage, stop=stop, until=until)
     except Exception as e:
         print(f"[ERROR] Ollama generation failed: {e}")
         return "[Ollama error: no output]"
 
+def embed_sources(texts):
+    return get_client().embed(texts, model=MODEL_NAME)
+
+# Finished batches per (temperature, source sentence); TRANSLATION_MEMORY_PATH or --tm enables it
+TRANSLATION_MEMORY = open_translation_memory(embed=embed_sources, embed_model=MODEL_NAME)
+
+def remembered_batch(input_text, temperature):
+    # A stored batch for this (or a near-identical) input, tagged with how it matched
+    if TRANSLATION_MEMORY is None or not input_text:
+        return None
+    value, match = TRANSLATION_MEMORY.lookup(f"statsig:{MODEL_NAME}:{temperature}", input_text)
+    if value is None:
+        return None
+    print(f"[INFO] Translation memory {match['match']} match ({match['similarity']:.3f}) at temperature {temperature}")
+    return {**value, 'translation_memory': match}
+
 def parse_translation_output(output):
     lines = output.splitlines()
     jp_lines = []
@@ -67,31 +129,171 @@ def count_japanese_chars(text):
     kanji = sum(1 for c in text if '\u4e00' <= c <= '\u9fff')
     return {'hiragana': hiragana, 'katakana': katakana, 'kanji': kanji}
 
-def run_stat_sig_batch(input_text, temperature=0.5, min_runs=10, max_runs=31):
+def backtranslate_japanese(parsed_jp, temperature=0.5, sample=None):
+    back_en_raw = call_ollama_generation(f"Translate this to English. Only output the English translation, no commentary or explanation:\n\n{parsed_jp}", temperature=temperature, sample=sample, stage='backtranslate', source=parsed_jp)
+    return parse_backtranslation_output(back_en_raw)
+
+def translate_stage(input_text, run, temperature=0.5, checkpoint=None):
+    # With a resumed checkpoint, finished runs and runs that only lack their
+    # backtranslation reuse the logged Japanese instead of generating again
+    if checkpoint is not None:
+        done = checkpoint.get_result(temperature, run)
+        if done is not None:
+            return done['japanese']
+        logged = checkpoint.get_forward(temperature, run)
+        if logged is not None:
+            return logged
+    prompt = f"Translate all of the following English sentences to Japanese, preserving each sentence, as if you were speaking in a generally polite, but not overly formal, manner:\n\n{input_text}"
+    jp_raw = call_ollama_generation(prompt, temperature=temperature, sample=run, stage='translate', source=input_text)
+    parsed_jp = parse_translation_output(jp_raw)
+    if checkpoint is not None:
+        checkpoint.record_forward(temperature, run, parsed_jp)
+    return parsed_jp
+
+def run_single_translation(input_text, run, temperature=0.5, backtranslate=None, checkpoint=None):
+    # One translate + backtranslate pair; safe to call from worker threads. `backtranslate`
+    # is a per-batch CallOnce so identical Japanese outputs are backtranslated only once.
+    parsed_jp = translate_stage(input_text, run, temperature, checkpoint)
+    return backtranslate_stage(input_text, run, parsed_jp, temperature, backtranslate, checkpoint)
+
+def backtranslate_stage(input_text, run, parsed_jp, temperature=0.5, backtranslate=None, checkpoint=None):
+    if checkpoint is not None:
+        done = checkpoint.get_result(temperature, run)
+        if done is not None:
+            print(f"Run {run}: {done['japanese']} (resumed)")
+            return done
+    char_counts = count_japanese_chars(parsed_jp)
+    if not parsed_jp:
+        backtranslation = ''
+    elif backtranslate is None:
+        backtranslation = backtranslate_japanese(parsed_jp, temperature, run)
+    else:
+        backtranslation = backtranslate(normalize_candidate(parsed_jp), parsed_jp, temperature, run)
+    result = {
+        'run': run,
+        'input_text': input_text,
+        'japanese': parsed_jp,
+        'backtranslation': backtranslation,
+        'temperature': temperature,
+        'hiragana': char_counts['hiragana'],
+        'katakana': char_counts['katakana'],
+        'kanji': char_counts['kanji']
+    }
+    print(f"Run {run}: {parsed_jp} [ひ:{char_counts['hiragana']} カ:{char_counts['katakana']} 漢:{char_counts['kanji']}]" )
+    if checkpoint is not None:
+        checkpoint.record_result(temperature, run, result)
+    return result
+
+def run_pooled_batch(input_text, temperature, min_runs, max_runs, early_stop, concurrency, backtranslate, checkpoint=None):
     results = []
-    for i in range(31):
-        prompt = f"Translate all of the following English sentences to Japanese, preserving each sentence, as if you were speaking in a generally polite, but not overly formal, manner:\n\n{input_text}"
-        jp_raw = call_ollama_generation(prompt, max_new_tokens=128, temperature=temperature)
-        parsed_jp = parse_translation_output(jp_raw)
-        char_counts = count_japanese_chars(parsed_jp)
-        if parsed_jp:
-            back_en_raw = call_ollama_generation(f"Translate this to English. Only output the English translation, no commentary or explanation:\n\n{parsed_jp}", max_new_tokens=128, temperature=temperature)
-            parsed_en = parse_backtranslation_output(back_en_raw)
-            backtranslation = parsed_en
-        else:
-            backtranslation = ''
-        result = {
-            'run': i+1,
-            'input_text': input_text,
-            'japanese': parsed_jp,
-            'backtranslation': backtranslation,
-            'temperature': temperature,
-            'hiragana': char_counts['hiragana'],
-            'katakana': char_counts['katakana'],
-            'kanji': char_counts['kanji']
-        }
-        results.append(result)
-        print(f"Run {i+1}: {parsed_jp} [ひ:{char_counts['hiragana']} カ:{char_counts['katakana']} 漢:{char_counts['kanji']}]" )
+    stop_reason = 'max_runs'
+    wave_size = max(1, concurrency) if early_stop else max_runs
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        while len(results) < max_runs:
+            wave = range(len(results), min(max_runs, len(results) + wave_size))
+            if concurrency > 1:
+                results.extend(pool.map(lambda i: run_single_translation(input_text, i+1, temperature, backtranslate, checkpoint), wave))
+            else:
+                results.extend(run_single_translation(input_text, i+1, temperature, backtranslate, checkpoint) for i in wave)
+            if early_stop:
+                stop, reason = should_stop_early(results, min_runs=min_runs, max_runs=max_runs)
+                if stop:
+                    stop_reason = reason
+                    break
+    return results, stop_reason
+
+def run_pipelined_batch(input_text, temperature, min_runs, max_runs, early_stop,
+                        translate_workers, backtranslate_workers, backtranslate, checkpoint=None):
+    done = []
+    stop = {'reason': 'max_runs'}
+
+    def on_result(i, result):
+        done.append(result)
+        if early_stop:
+            should_stop, reason = should_stop_early(done, min_runs=min_runs, max_runs=max_runs)
+            if should_stop:
+                stop['reason'] = reason
+                return True
+        return False
+
+    results, stages = run_two_stage(
+        max_runs,
+        lambda i: translate_stage(input_text, i+1, temperature, checkpoint),
+        lambda i, parsed_jp: backtranslate_stage(input_text, i+1, parsed_jp, temperature, backtranslate, checkpoint),
+        first_workers=translate_workers,
+        second_workers=backtranslate_workers,
+        on_result=on_result
+    )
+    for stage in stages:
+        stage.print()
+    return results, stop['reason']
+
+def new_backtranslate_memo(temperature, checkpoint=None):
+    # Per-temperature CallOnce over backtranslate_japanese, primed with resumed runs
+    backtranslate = CallOnce(backtranslate_japanese)
+    if checkpoint is not None:
+        for r in checkpoint.results_for(temperature).values():
+            if r['japanese']:
+                backtranslate.prime(normalize_candidate(r['japanese']), r['backtranslation'])
+    return backtranslate
+
+def run_adaptive_runs(input_text, temperatures, budget, initial=3, max_runs=31, concurrency=1, checkpoint=None):
+    # Spend `budget` runs across the temperatures by AdaptiveAllocator (see allocation.py)
+    # instead of max_runs each. Returns ({temperature: results in run order},
+    # {temperature: backtranslate memo}, allocator); feed each list to run_stat_sig_batch.
+    allocator = AdaptiveAllocator(temperatures, budget, initial=initial, max_per_key=max_runs)
+    memos = {t: new_backtranslate_memo(t, checkpoint) for t in temperatures}
+    runs = {t: {} for t in temperatures}
+    if checkpoint is not None:
+        for t in temperatures:
+            for run, r in checkpoint.results_for(t).items():
+                runs[t][run] = r
+                allocator.seed(t, run, r['japanese'])
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        while True:
+            batch = allocator.next_batch(max(1, concurrency))
+            if not batch:
+                break
+            done = pool.map(lambda job: run_single_translation(input_text, job[1], job[0], memos[job[0]], checkpoint), batch)
+            for (t, run), result in zip(batch, done):
+                runs[t][run] = result
+                allocator.record(t, run, result['japanese'])
+    allocator.print()
+    return {t: [runs[t][run] for run in sorted(runs[t])] for t in temperatures}, memos, allocator
+
+def run_stat_sig_batch(input_text, temperature=0.5, min_runs=10, max_runs=31, concurrency=1, early_stop=False,
+                       pipelined=False, translate_workers=1, backtranslate_workers=1, checkpoint=None,
+                       results=None, backtranslate=None):
+    # concurrency > 1 fans the runs out over a bounded thread pool (Ollama serves
+    # OLLAMA_NUM_PARALLEL requests at once). Results are always ordered by run number.
+    # With early_stop, runs go in waves of `concurrency` and stop once should_stop_early says
+    # the outputs have converged; otherwise exactly max_runs runs are made.
+    # pipelined replaces the pool with a translate -> backtranslate pipeline (see pipeline.py)
+    # whose stages have their own worker counts; early stopping is checked per run.
+    # checkpoint (a SweepCheckpoint) logs every run and skips runs a resumed log already has.
+    # results (with their backtranslate memo) are runs already made by run_adaptive_runs;
+    # only the selection and merges are done for them.
+    # A translation memory hit (see remembered_batch) is returned without any generation.
+    if results is None:
+        remembered = remembered_batch(input_text, temperature)
+        if remembered is not None:
+            return remembered
+    if backtranslate is None:
+        backtranslate = new_backtranslate_memo(temperature, checkpoint)
+    if results is not None:
+        stop_reason = 'budget'
+    elif pipelined:
+        results, stop_reason = run_pipelined_batch(input_text, temperature, min_runs, max_runs, early_stop,
+                                                   translate_workers, backtranslate_workers, backtranslate, checkpoint)
+    else:
+        results, stop_reason = run_pooled_batch(input_text, temperature, min_runs, max_runs, early_stop,
+                                                concurrency, backtranslate, checkpoint)
+    if stop_reason not in ('max_runs', 'budget'):
+        print(f"[INFO] Stopped early after {len(results)} runs ({stop_reason})")
+    for g in group_candidates([r['japanese'] for r in results]):
+        for i in g['indices']:
+            results[i]['multiplicity'] = g['multiplicity']
+    print(f"[INFO] {backtranslate.calls} backtranslations for {len(results)} runs ({backtranslate.reused} duplicates reused)")
 
     # Remove lowest 17 by length (shortest Japanese outputs)
     sorted_results = sorted(results, key=lambda r: len(r['japanese']), reverse=True)
@@ -116,7 +318,7 @@ def run_stat_sig_batch(input_text, temperature=0.5, min_runs=10, max_runs=31):
 
     def llm_merge(jp_list, label):
         merge_prompt = f"You are an expert Japanese translator. Merge the following {len(jp_list)} Japanese translations into a single, best, natural, and accurate Japanese translation. Only output the merged Japanese translation.\n\n" + "\n\n".join(jp_list)
-        merged = call_ollama_generation(merge_prompt, max_new_tokens=256, temperature=temperature)
+        merged = call_ollama_generation(merge_prompt, temperature=temperature, stage='fuse', source=jp_list)
         print(f"[LLM Merge: {label}]\n{merged}\n")
         return merged.strip()
 
@@ -128,15 +330,17 @@ def run_stat_sig_batch(input_text, temperature=0.5, min_runs=10, max_runs=31):
     def get_backtranslation(jp):
         back_en_raw = call_ollama_generation(
             f"Translate this to English. Only output the English translation, no commentary or explanation:\n\n{jp}",
-            max_new_tokens=256, temperature=temperature)
+            temperature=temperature, stage='backtranslate', source=jp)
         return parse_backtranslation_output(back_en_raw)
 
     merged_14_backtranslation = get_backtranslation(merged_14)
     merged_3_backtranslation = get_backtranslation(merged_3)
     final_merged_backtranslation = get_backtranslation(final_merged)
 
-    return {
+    batch = {
         'all_results': results,
+        'runs_completed': len(results),
+        'stop_reason': stop_reason,
         'top_14': top_14_out,
         'top_3': top_3_out,
         'merged_14': merged_14,
@@ -146,26 +350,95 @@ def run_stat_sig_batch(input_text, temperature=0.5, min_runs=10, max_runs=31):
         'final_merged': final_merged,
         'final_merged_backtranslation': final_merged_backtranslation
     }
+    if TRANSLATION_MEMORY is not None and input_text and final_merged:
+        TRANSLATION_MEMORY.store(f"statsig:{MODEL_NAME}:{temperature}", input_text, batch)
+    return batch
 
 def main():
     parser = argparse.ArgumentParser(description="Run stat-sig batch translation and save results as JSON (no embeddings).")
     parser.add_argument('--temperatures', type=float, nargs='*', default=[0.5], help='Sampling temperatures (space separated, e.g. 0.1 0.5 0.9)')
     parser.add_argument('--min_runs', type=int, default=10, help='Minimum runs before checking for significance')
     parser.add_argument('--max_runs', type=int, default=31, help='Maximum number of runs')
+    parser.add_argument('--early_stop', action='store_true', help='Stop a batch between min_runs and max_runs once outputs converge')
+    parser.add_argument('--concurrency', type=int, default=1, help='Translate/backtranslate pairs to run in parallel (match OLLAMA_NUM_PARALLEL)')
+    parser.add_argument('--pipeline', action='store_true', help='Overlap forward translations and backtranslations across runs')
+    parser.add_argument('--translate_workers', type=int, default=1, help='Concurrent forward translations in --pipeline mode')
+    parser.add_argument('--backtranslate_workers', type=int, default=1, help='Concurrent backtranslations in --pipeline mode')
+    parser.add_argument('--budget', type=int, default=None, help='Adaptive mode: total runs to spread over all temperatures by output diversity instead of max_runs each')
+    parser.add_argument('--adaptive_initial', type=int, default=3, help='Pilot runs per temperature before adaptive allocation starts')
+    parser.add_argument('--tm', type=str, default=DEFAULT_TM_PATH, help='SQLite translation memory; finished batches for a known sentence are reused (empty disables it)')
+    parser.add_argument('--tm_threshold', type=float, default=DEFAULT_TM_THRESHOLD, help='Enable fuzzy translation memory matches at this embedding cosine similarity (e.g. 0.97; default exact only)')
+    parser.add_argument('--log', type=str, default='latest_translation.jsonl', help='Append-only JSONL checkpoint of every run and finished temperature')
+    parser.add_argument('--resume', action='store_true', help='Continue an interrupted batch from --log, running only what is missing')
+    add_client_args(parser)
     parser.add_argument('input_text', nargs='?', default='', help='Input English text to translate (last argument, optional)')
     args = parser.parse_args()
+    if args.budget is not None and args.budget < args.adaptive_initial * len(args.temperatures):
+        parser.error('--budget must cover --adaptive_initial runs for every temperature')
+    if args.budget is not None and (args.pipeline or args.early_stop or args.translate_workers > 1
+                                    or args.backtranslate_workers > 1):
+        parser.error('--budget cannot be combined with --pipeline, --early_stop, --translate_workers or --backtranslate_workers')
+    configure_client_from_args(args, min_pool_size=max(args.concurrency, args.translate_workers + args.backtranslate_workers))
+
+    global TRANSLATION_MEMORY
+    TRANSLATION_MEMORY = open_translation_memory(args.tm, threshold=args.tm_threshold, embed=embed_sources, embed_model=MODEL_NAME)
+
+    try:
+        checkpoint = SweepCheckpoint.open(args.log, {'input_text': args.input_text}, resume=args.resume)
+    except ValueError as e:
+        parser.error(str(e))
+
+    adaptive = {}
+    remembered = {}
+    if args.budget is not None:
+        # Temperatures answered by the translation memory take no share of the budget
+        for t in args.temperatures:
+            if checkpoint.get_batch(t) is None:
+                hit = remembered_batch(args.input_text, t)
+                if hit is not None:
+                    remembered[t] = hit
+        open_temps = [t for t in args.temperatures if checkpoint.get_batch(t) is None and t not in remembered]
+        # Runs of temperatures finished in a resumed log already used part of the budget
+        used = sum(checkpoint.get_batch(t)['runs_completed'] for t in args.temperatures if checkpoint.get_batch(t) is not None)
+        if open_temps:
+            print(f"\n=== Allocating {args.budget - used} runs across temperatures {open_temps} ===")
+            runs, memos, allocator = run_adaptive_runs(args.input_text, open_temps, args.budget - used,
+                                                       initial=args.adaptive_initial, max_runs=args.max_runs,
+                                                       concurrency=args.concurrency, checkpoint=checkpoint)
+            spent = allocator.summary()
+            for t in open_temps:
+                allocation = {'budget': args.budget, 'spent': spent['spent'] + used, **allocator.key_summary(t)}
+                adaptive[t] = (runs[t], memos[t], allocation)
 
     all_temp_results = []
     for temp in args.temperatures:
+        done = checkpoint.get_batch(temp)
+        if done is not None:
+            print(f"\n=== Temperature {temp} already finished in {args.log}, reusing it ===")
+            all_temp_results.append(done)
+            continue
         print(f"\n=== Running batch for temperature {temp} ===")
-        results = run_stat_sig_batch(
+        runs, memo, allocation = adaptive.get(temp, (None, None, None))
+        results = remembered.get(temp) or run_stat_sig_batch(
             args.input_text,
-            temperature=temp
+            temperature=temp,
+            min_runs=args.min_runs,
+            max_runs=args.max_runs,
+            concurrency=args.concurrency,
+            early_stop=args.early_stop,
+            pipelined=args.pipeline,
+            translate_workers=args.translate_workers,
+            backtranslate_workers=args.backtranslate_workers,
+            checkpoint=checkpoint,
+            results=runs,
+            backtranslate=memo
         )
         out_data = {
             'input_text': args.input_text,
             'temperature': temp,
             'all_results': results['all_results'],
+            'runs_completed': results['runs_completed'],
+            'stop_reason': results['stop_reason'],
             'top_14': results['top_14'],
             'top_3': results['top_3'],
             'merged_14': results['merged_14'],
@@ -175,7 +448,16 @@ def main():
             'final_merged': results['final_merged'],
             'final_merged_backtranslation': results['final_merged_backtranslation']
         }
+        if 'translation_memory' in results:
+            out_data['translation_memory'] = results['translation_memory']
+        if allocation is not None:
+            # How this temperature's share of the adaptive budget was spent
+            out_data['allocation'] = allocation
+        checkpoint.record_batch(temp, out_data)
         all_temp_results.append(out_data)
+    checkpoint.close()
+    if TRANSLATION_MEMORY is not None:
+        TRANSLATION_MEMORY.print_stats()
 
     # Save all results in a single JSON file (list of dicts, one per temperature)
     with open('latest_translation.json', 'w', encoding='utf-8') as f:
@@ -201,6 +483,7 @@ def main():
                     'length': len(r['japanese'])
                 })
     print("Wrote all runs for all temperatures to latest_translation.csv")
+    get_client().print_stats()
 
 if __name__ == '__main__':
     main()
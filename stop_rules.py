@@ -0,0 +1,67 @@
+# Stop sequences and incremental stop predicates for translation calls.
+# Models like to follow a translation with "Note: ...", an explanation or a "Here is ...:"
+# preamble to a second version, which the output parsers throw away. The stop sequences end
+# the obvious cases on the server; the predicates are checked by the streaming client at
+# every line break and close the stream once a complete content line has been followed by a
+# complete line that is unmistakably commentary, so the commentary is never decoded.
+# Lines the parsers merely skip (romanization, a parenthesised echo, an English line with
+# punctuation) do not end the stream: real content may still follow them.
+import re
+
+JAPANESE = re.compile(r'[぀-ヿ一-鿿]')
+LATIN = re.compile(r'[A-Za-z]')
+# Headings that only ever introduce commentary; an optional leading bracket or markdown
+# emphasis is allowed ("(Note: ...)", "**Explanation:**")
+COMMENTARY_LINE = re.compile(
+    r'^[\(（\[\*]*\s*(?:'
+    r'Notes?\s*[:：\-]|Explanation\s*[:：]|Translation notes?\s*[:：]|Romanization\s*[:：]|'
+    r'In English\s*[:：]|Here\b.*[:：]\**$|'
+    r'注\s*[:：]|注釈|解説\s*[:：]|補足\s*[:：]|※'
+    r')', re.IGNORECASE)
+
+COMMENTARY_STOP = ["\nNote:", "\n(Note", "\nExplanation:", "\n注：", "\n注:"]
+
+
+def _is_japanese_content(line):
+    return bool(JAPANESE.search(line)) and not COMMENTARY_LINE.match(line)
+
+
+def _is_english_content(line):
+    return bool(LATIN.search(line)) and not COMMENTARY_LINE.match(line)
+
+
+def _commentary_after_content(text, is_content):
+    # True once a complete commentary line follows a content line; the line still being
+    # streamed (after the last newline) is not judged yet
+    seen_content = False
+    for line in text.split('\n')[:-1]:
+        line = line.strip()
+        if not line:
+            continue
+        if COMMENTARY_LINE.match(line):
+            if seen_content:
+                return True
+        elif is_content(line):
+            seen_content = True
+    return False
+
+
+def japanese_done(text):
+    return _commentary_after_content(text, _is_japanese_content)
+
+
+def english_done(text):
+    return _commentary_after_content(text, _is_english_content)
+
+
+# stage -> (stop sequences, predicate); translate and fuse produce Japanese, backtranslate English
+STAGE_RULES = {
+    'translate': (COMMENTARY_STOP, japanese_done),
+    'fuse': (COMMENTARY_STOP, japanese_done),
+    'backtranslate': (COMMENTARY_STOP, english_done),
+}
+
+
+def rules_for_stage(stage):
+    # (stop, until) for OllamaClient.generate; (None, None) for stages without rules
+    return STAGE_RULES.get(stage, (None, None))
@@ -1,33 +1,29 @@
-# Standalone CLI for 31-run translation at multiple temperatures (no external project imports)
+# Standalone CLI for 31-run translation at multiple temperatures (only imports the shared root modules)
 import argparse
 import json
 import os
 import re
-import requests
-
-def call_ollama_generation(prompt, model_name, max_new_tokens=128, temperature=0.7):
-    url = "http://localhost:11434/api/generate"
-    payload = {
-        "model": model_name,
-        "prompt": prompt,
-        "options": {"num_predict": max_new_tokens, "temperature": temperature}
-    }
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from ollama_client import get_client, add_client_args, configure_client_from_args
+from candidates import normalize_candidate, CallOnce
+from pipeline import run_two_stage, run_round_robin
+from allocation import AdaptiveAllocator
+from token_budget import num_predict
+from stop_rules import rules_for_stage
+from result_log import ResultLog, SweepCheckpoint
+
+def call_ollama_generation(prompt, model_name, max_new_tokens=None, temperature=0.7, sample=None, stage=None, source=None):
+    # Without max_new_tokens the budget comes from token_budget for the stage and its source text;
+    # the stage's stop rules cut trailing commentary off the stream
+    if max_new_tokens is None:
+        max_new_tokens = num_predict(stage, source)
+    stop, until = rules_for_stage(stage)
     try:
-        resp = requests.post(url, json=payload, timeout=120, stream=True)
-        output = ""
-        for line in resp.iter_lines():
-            if not line:
-                continue
-            try:
-                data = line.decode("utf-8")
-                if data.startswith('{'):
-                    chunk = json.loads(data)
-                    if 'response' in chunk:
-                        output += chunk['response']
-            except Exception as e:
-                print(f"[DEBUG] JSON parse error: {e} for data: {data}")
-                continue
-        return output.strip()
+        return get_client().generate(prompt, model=model_name, max_new_tokens=max_new_tokens, temperature=temperature,
+                                     sample=sample, stage=stage, stop=stop, until=until)
     except Exception as e:
         print(f"[ERROR] Ollama generation failed: {e}")
         return "[Ollama error: no output]"
@@ -66,65 +62,215 @@ def parse_backtranslation_output(output):
             en_lines.append(l)
     return {'english': ' '.join(en_lines).strip()}
 
-def run_31_translations(text, model, temperature):
-    global all_results, output_file, text_arg, model_arg
-    for i in range(31):
-        prompt = f"Translate all of the following English sentences to Japanese, preserving each sentence, as if you were speaking in a generally polite, but not overly formal, manner:\n\n{text}"
-        jp_raw = call_ollama_generation(prompt, model, max_new_tokens=128, temperature=temperature)
-        parsed_jp = parse_translation_output(jp_raw)
-        run_num = i+1
-        pad = ' ' if run_num < 10 else ''
-        print(f"[TEMP {temperature}] Run {run_num}/31...{pad} {parsed_jp['japanese']}")
-        # Backtranslate to English
-        if parsed_jp['japanese']:
-            back_en_raw = call_ollama_generation(f"Translate this to English. Only output the English translation, no commentary or explanation:\n\n{parsed_jp['japanese']}", model, max_new_tokens=128, temperature=temperature)
-            parsed_en = parse_backtranslation_output(back_en_raw)
-            backtranslation = parsed_en['english']
-        else:
-            backtranslation = ''
-        result = {
-            'japanese': parsed_jp['japanese'],
-            'backtranslation': backtranslation,
+def translate_run(text, model, temperature, run_num):
+    prompt = f"Translate all of the following English sentences to Japanese, preserving each sentence, as if you were speaking in a generally polite, but not overly formal, manner:\n\n{text}"
+    jp_raw = call_ollama_generation(prompt, model, temperature=temperature, sample=run_num, stage='translate', source=text)
+    parsed_jp = parse_translation_output(jp_raw)
+    pad = ' ' if run_num < 10 else ''
+    print(f"[TEMP {temperature}] Run {run_num}/31...{pad} {parsed_jp['japanese']}")
+    return parsed_jp['japanese']
+
+def backtranslate_run(japanese, model, temperature, run_num):
+    if not japanese:
+        return ''
+    back_en_raw = call_ollama_generation(f"Translate this to English. Only output the English translation, no commentary or explanation:\n\n{japanese}", model, temperature=temperature, sample=run_num, stage='backtranslate', source=japanese)
+    return parse_backtranslation_output(back_en_raw)['english']
+
+def default_log_path(output):
+    return os.path.splitext(output)[0] + '.jsonl'
+
+def compact_log(log_path, output):
+    # Rewrite the existing JSON layout ({'text', 'model', 'results'}) from the JSONL log,
+    # ordered by (temperature, run) so resumed sweeps compact the same as uninterrupted ones
+    header, records = ResultLog.read(log_path)
+    finished = {(r['temperature'], r['run']): r['result'] for r in records if r.get('type') == 'result'}
+    results = [finished[key] for key in sorted(finished)]
+    data = {'text': header.get('text', ''), 'model': header.get('model', ''), 'results': results}
+    allocations = [r for r in records if r.get('type') == 'allocation']
+    if allocations:
+        data['allocation'] = {k: v for k, v in allocations[-1].items() if k != 'type'}
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    return len(results)
+
+def temperature_runs(text, model, temperature, checkpoint):
+    # (missing run numbers, start_run, finish_run, record_result) for one temperature,
+    # shared by the per-temperature loop and the interleaved sweep scheduler
+    # Identical Japanese outputs (common at low temperature) share one backtranslation
+    backtranslate = CallOnce(backtranslate_run)
+    for result in checkpoint.results_for(temperature).values():
+        backtranslate.prime(normalize_candidate(result['japanese']), result['backtranslation'])
+    runs = checkpoint.missing_runs(temperature, range(1, 32))
+    if len(runs) < 31:
+        print(f"[TEMP {temperature}] Resuming: {31 - len(runs)}/31 runs already done")
+
+    def start_run(run_num):
+        # A run that crashed after its forward translation only needs the backtranslation
+        japanese = checkpoint.get_forward(temperature, run_num)
+        if japanese is None:
+            japanese = translate_run(text, model, temperature, run_num)
+            checkpoint.record_forward(temperature, run_num, japanese)
+        return japanese
+
+    def finish_run(run_num, japanese):
+        return {
+            'japanese': japanese,
+            'backtranslation': backtranslate(normalize_candidate(japanese), japanese, model, temperature, run_num),
             'input_text': text,
             'temperature': temperature
         }
-        all_results.append(result)
-        # Write after every run
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump({'text': text_arg, 'model': model_arg, 'results': all_results}, f, ensure_ascii=False, indent=2)
+
+    def record_result(run_num, result):
+        # Append one line per run; the JSON file is only compacted from the log at the end
+        checkpoint.record_result(temperature, run_num, result)
+
+    return runs, start_run, finish_run, record_result
+
+def run_31_translations(text, model, temperature, checkpoint, pipelined=False, translate_workers=1, backtranslate_workers=1):
+    runs, start_run, finish_run, record_result = temperature_runs(text, model, temperature, checkpoint)
+
+    if not pipelined:
+        for run_num in runs:
+            record_result(run_num, finish_run(run_num, start_run(run_num)))
+        return None
+
+    # Forward translations feed a bounded queue drained by the backtranslation workers;
+    # results are still recorded (and checkpointed) in run order
+    _, stages = run_two_stage(
+        len(runs),
+        lambda i: start_run(runs[i]),
+        lambda i, japanese: finish_run(runs[i], japanese),
+        first_workers=translate_workers,
+        second_workers=backtranslate_workers,
+        on_result=lambda i, result: record_result(runs[i], result)
+    )
+    for stage in stages:
+        stage.print()
+    return None
+
+def run_temperature_sweep(text, model, temps, workers, checkpoint):
+    # All temperatures share one pool of `workers` runs in flight, taken from each
+    # temperature in turn, so the sweep is limited by server throughput instead of
+    # finishing one temperature before starting the next
+    lanes = {}
+    handlers = {}
+    done = {}
+    for temperature in temps:
+        runs, start_run, finish_run, record_result = temperature_runs(text, model, temperature, checkpoint)
+        lanes[temperature] = runs
+        handlers[temperature] = (start_run, finish_run, record_result)
+        done[temperature] = 31 - len(runs)
+
+    def run(temperature, run_num):
+        start_run, finish_run, _ = handlers[temperature]
+        return finish_run(run_num, start_run(run_num))
+
+    def on_done(temperature, run_num, result):
+        handlers[temperature][2](run_num, result)
+        done[temperature] += 1
+        progress = ', '.join(f"{t}: {n}/31" for t, n in done.items())
+        print(f"[SWEEP] T={temperature} run {run_num} done | {progress}")
+
+    metrics = run_round_robin(lanes, run, workers=workers, on_done=on_done)
+    for temperature, m in metrics.items():
+        s = m.snapshot()
+        if s['items']:
+            print(f"[STATS] temperature {temperature}: {s['items']} runs, mean {s['mean_s']:.3f}s, "
+                  f"{s['wall_s']:.1f}s from first start to last finish")
+    return None
+
+def run_adaptive_sweep(text, model, temps, budget, checkpoint, workers=1, initial=3):
+    # Spend `budget` runs across the grid by AdaptiveAllocator instead of 31 per temperature;
+    # each wave of `workers` runs is assigned from the outputs seen so far
+    allocator = AdaptiveAllocator(temps, budget, initial=initial, max_per_key=31)
+    handlers = {}
+    for temperature in temps:
+        _, start_run, finish_run, record_result = temperature_runs(text, model, temperature, checkpoint)
+        handlers[temperature] = (start_run, finish_run, record_result)
+        for run_num, result in checkpoint.results_for(temperature).items():
+            allocator.seed(temperature, run_num, result['japanese'])
+
+    def run(job):
+        temperature, run_num = job
+        start_run, finish_run, _ = handlers[temperature]
+        return finish_run(run_num, start_run(run_num))
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        while True:
+            batch = allocator.next_batch(max(1, workers))
+            if not batch:
+                break
+            for (temperature, run_num), result in zip(batch, pool.map(run, batch)):
+                handlers[temperature][2](run_num, result)
+                allocator.record(temperature, run_num, result['japanese'])
+    allocator.print()
+    # compact_log copies the latest allocation record into the output JSON
+    checkpoint.log.append({'type': 'allocation', **allocator.summary()})
     return None
 
 def main():
     parser = argparse.ArgumentParser(description="Run 31 translations at different temperatures and compare results.")
-    parser.add_argument('--text', type=str, required=True, help='Input English text to translate')
+    parser.add_argument('--text', type=str, help='Input English text to translate (required unless --compact)')
     parser.add_argument('--model', type=str, default='qwen2.5:7b-instruct', help='Model name')
     parser.add_argument('--output', type=str, default='tempspread_results.json', help='Output JSON file')
+    parser.add_argument('--log', type=str, default=None, help='Append-only JSONL results log (default: output path with .jsonl)')
+    parser.add_argument('--compact', action='store_true', help='Only rewrite the output JSON from the results log, then exit')
+    parser.add_argument('--resume', action='store_true', help='Continue an interrupted sweep from the results log, running only missing runs')
+    parser.add_argument('--pipeline', action='store_true', help='Overlap forward translations and backtranslations across runs')
+    parser.add_argument('--translate_workers', type=int, default=1, help='Concurrent forward translations in --pipeline mode')
+    parser.add_argument('--backtranslate_workers', type=int, default=1, help='Concurrent backtranslations in --pipeline mode')
+    parser.add_argument('--temperatures', type=float, nargs='+', default=[0.1, 0.3, 0.5, 0.7, 0.9], help='Temperature grid to sweep')
+    parser.add_argument('--budget', type=int, default=None, help='Adaptive mode: total runs to spread over the grid by output diversity instead of 31 per temperature')
+    parser.add_argument('--adaptive_initial', type=int, default=3, help='Pilot runs per temperature before adaptive allocation starts')
+    parser.add_argument('--sweep_workers', type=int, default=1, help='Runs in flight across all temperatures; above 1, temperatures are interleaved on one shared queue')
+    add_client_args(parser)
     args = parser.parse_args()
+    log_path = args.log or default_log_path(args.output)
+    if args.compact:
+        count = compact_log(log_path, args.output)
+        print(f"[INFO] Compacted {count} results from {log_path} to {args.output}")
+        return
+    if not args.text:
+        parser.error('--text is required unless --compact is given')
+    if args.pipeline and (args.sweep_workers > 1 or args.budget is not None):
+        parser.error('--pipeline cannot be combined with --sweep_workers > 1 or --budget')
+    configure_client_from_args(args, min_pool_size=max(args.translate_workers + args.backtranslate_workers, args.sweep_workers))
 
-    temps = [0.1, 0.3, 0.5, 0.7, 0.9]
-    global all_results, temp, output_file, text_arg, model_arg
-    all_results = []
+    # Duplicates in the grid would schedule the same (temperature, run) cells twice
+    temps = list(dict.fromkeys(args.temperatures))
+    if args.budget is not None and args.budget < args.adaptive_initial * len(temps):
+        parser.error('--budget must cover --adaptive_initial runs for every temperature')
     # Ensure output directory exists
     output_dir = os.path.dirname(args.output)
     if output_dir and not os.path.exists(output_dir):
         os.makedirs(output_dir, exist_ok=True)
-    # Write initial empty structure
-    output_file = args.output
-    text_arg = args.text
-    model_arg = args.model
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump({'text': text_arg, 'model': model_arg, 'results': []}, f, ensure_ascii=False, indent=2)
-    all_results = []
     try:
-        for temp in temps:
-            run_31_translations(args.text, args.model, temp)
-    finally:
+        checkpoint = SweepCheckpoint.open(log_path, {'text': args.text, 'model': args.model}, resume=args.resume)
+    except ValueError as e:
+        parser.error(str(e))
+    if not args.resume:
+        # Write initial empty structure
         with open(args.output, 'w', encoding='utf-8') as f:
-            json.dump({'text': text_arg, 'model': model_arg, 'results': all_results}, f, ensure_ascii=False, indent=2)
-    if not all_results:
+            json.dump({'text': args.text, 'model': args.model, 'results': []}, f, ensure_ascii=False, indent=2)
+    try:
+        if args.budget is not None:
+            run_adaptive_sweep(args.text, args.model, temps, args.budget, checkpoint, workers=args.sweep_workers,
+                               initial=args.adaptive_initial)
+        elif args.sweep_workers > 1:
+            run_temperature_sweep(args.text, args.model, temps, args.sweep_workers, checkpoint)
+        else:
+            for temperature in temps:
+                run_31_translations(args.text, args.model, temperature, checkpoint, pipelined=args.pipeline,
+                                    translate_workers=args.translate_workers,
+                                    backtranslate_workers=args.backtranslate_workers)
+    finally:
+        checkpoint.close()
+        total = compact_log(log_path, args.output)
+    if not total:
         print(f"[ERROR] No results were written to {args.output}")
     else:
         print(f"[INFO] Saved all results to {args.output}")
+    get_client().print_stats()
 
 if __name__ == '__main__':
     main()
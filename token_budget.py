@@ -0,0 +1,83 @@
+# Length-aware num_predict per pipeline stage.
+# Output tokens dominate call latency, so instead of a flat 128/256 every call gets a
+# budget proportional to what it has to produce: the estimated token length of its source
+# text times a per-stage ratio, plus a fixed margin, clamped to [min_tokens, max_tokens].
+#   translate     - English source -> Japanese (one candidate; times n for multi-sample calls)
+#   backtranslate - Japanese source -> English
+#   fuse          - several Japanese candidates -> one; sized from the longest candidate
+# Generations that still stop on the limit (done_reason "length") are counted per stage by
+# the client (see ollama_client.LatencyStats), which is the signal to raise a ratio.
+import math
+import os
+import re
+
+DEFAULT_STAGE_RATIOS = {'translate': 2.0, 'backtranslate': 1.5, 'fuse': 1.5}
+
+
+def parse_ratios(spec):
+    # "translate=2.5,fuse=1.2" -> {'translate': 2.5, 'fuse': 1.2}
+    ratios = {}
+    for part in (spec or '').split(','):
+        if not part.strip():
+            continue
+        stage, _, value = part.partition('=')
+        try:
+            ratios[stage.strip()] = float(value)
+        except ValueError:
+            raise ValueError(f"Bad num_predict ratio {part!r}; expected stage=number")
+    return ratios
+
+
+DEFAULT_NUM_PREDICT_RATIOS = {**DEFAULT_STAGE_RATIOS, **parse_ratios(os.environ.get("NUM_PREDICT_RATIOS", ""))}
+DEFAULT_NUM_PREDICT_MARGIN = int(os.environ.get("NUM_PREDICT_MARGIN", "32"))
+DEFAULT_NUM_PREDICT_MIN = int(os.environ.get("NUM_PREDICT_MIN", "32"))
+DEFAULT_NUM_PREDICT_MAX = int(os.environ.get("NUM_PREDICT_MAX", "1024"))
+
+
+def estimate_tokens(text):
+    # Rough tokenizer-free estimate: ~4 characters per token for ASCII text, about one
+    # token per CJK/kana character
+    if not text:
+        return 0
+    wide = len(re.findall(r'[^\x00-\x7f]', text))
+    return math.ceil((len(text) - wide) / 4) + wide
+
+
+class TokenBudget:
+    def __init__(self, ratios=None, margin=DEFAULT_NUM_PREDICT_MARGIN, min_tokens=DEFAULT_NUM_PREDICT_MIN,
+                 max_tokens=DEFAULT_NUM_PREDICT_MAX):
+        self.ratios = {**DEFAULT_NUM_PREDICT_RATIOS, **(ratios or {})}
+        self.margin = margin
+        self.min_tokens = min_tokens
+        self.max_tokens = max_tokens
+
+    def num_predict(self, stage, source, n=1, default=128):
+        # Budget for `n` outputs of `stage` from `source` (a string, or a list of candidates
+        # for fuse); `default` for stages without a ratio
+        ratio = self.ratios.get(stage)
+        if ratio is None:
+            return default
+        if isinstance(source, (list, tuple)):
+            length = max((estimate_tokens(s) for s in source), default=0)
+        else:
+            length = estimate_tokens(source)
+        budget = n * (math.ceil(length * ratio) + self.margin)
+        return max(self.min_tokens, min(self.max_tokens * n, budget))
+
+
+_budget = TokenBudget()
+
+
+def get_token_budget():
+    return _budget
+
+
+def configure_token_budget(**kwargs):
+    # Replace the process-wide budget (e.g. from CLI flags: ratios, margin, max_tokens)
+    global _budget
+    _budget = TokenBudget(**kwargs)
+    return _budget
+
+
+def num_predict(stage, source, n=1, default=128):
+    return _budget.num_predict(stage, source, n, default)
@@ -0,0 +1,173 @@
+# Sentence-level translation memory (SQLite): the finished output of a pipeline run is
+# stored per (scope, normalized source sentence). A lookup first checks the exact hash of
+# the normalized sentence; only on a miss is the sentence embedded and compared against the
+# stored sources of the same scope, and the closest one is reused if its cosine similarity
+# reaches `threshold`. Fuzzy reuse is opt-in (threshold None means exact matches only): the
+# generation model's embeddings put sentences that differ in a number or a negation very
+# close together, so a fuzzy hit is a guess. Its returned input_text fields are set to the
+# query so the output is never labelled with another sentence. Scope separates entries that are not interchangeable (pipeline,
+# model, temperature). The vector index is an in-memory matrix of unit-normalized float32
+# rows per scope, loaded once from the database; one matrix-vector product scores a query.
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from candidates import normalize_candidate
+
+DEFAULT_TM_PATH = os.environ.get("TRANSLATION_MEMORY_PATH", "")
+# Unset: exact matches only
+DEFAULT_TM_THRESHOLD = float(os.environ["TRANSLATION_MEMORY_THRESHOLD"]) if os.environ.get("TRANSLATION_MEMORY_THRESHOLD") else None
+
+
+def _with_input_text(value, source):
+    # Copy of a stored output with every input_text field replaced by `source`
+    if isinstance(value, dict):
+        return {k: source if k == 'input_text' else _with_input_text(v, source) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_with_input_text(v, source) for v in value]
+    return value
+
+
+class TranslationMemory:
+    def __init__(self, path, threshold=DEFAULT_TM_THRESHOLD, embed=None, embed_model=""):
+        # embed(texts) -> vectors plus a threshold enable fuzzy lookups; without either only
+        # exact matches are used
+        self.path = path
+        self.threshold = threshold
+        self.embed = embed if threshold is not None else None
+        self.embed_model = embed_model
+        tm_dir = os.path.dirname(path)
+        if tm_dir and not os.path.exists(tm_dir):
+            os.makedirs(tm_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, scope TEXT, source TEXT, value TEXT,"
+            " embed_model TEXT, embedding BLOB, created REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_scope ON entries(scope, embed_model)")
+        self._conn.commit()
+        # scope -> (keys, unit-normalized float32 matrix); built on first fuzzy lookup of the scope
+        self._index = {}
+        self.exact_hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(scope, source):
+        raw = json.dumps([scope, normalize_candidate(source)], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _load_index(self, scope):
+        index = self._index.get(scope)
+        if index is None:
+            rows = self._conn.execute(
+                "SELECT key, embedding FROM entries WHERE scope = ? AND embed_model = ? AND embedding IS NOT NULL",
+                (scope, self.embed_model)).fetchall()
+            keys = [k for k, _ in rows]
+            if rows:
+                matrix = np.array([np.frombuffer(blob, dtype=np.float32) for _, blob in rows])
+            else:
+                matrix = np.zeros((0, 0), dtype=np.float32)
+            index = self._index[scope] = (keys, matrix)
+        return index
+
+    def _embed_one(self, text):
+        if self.embed is None:
+            return None
+        try:
+            vectors = self.embed([text])
+        except Exception as e:
+            print(f"[WARN] Translation memory could not embed the source: {e}")
+            return None
+        if not vectors or vectors[0] is None or len(vectors[0]) == 0 or not np.any(vectors[0]):
+            return None
+        vector = np.asarray(vectors[0], dtype=np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def _get(self, key):
+        row = self._conn.execute("SELECT source, value FROM entries WHERE key = ?", (key,)).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def lookup(self, scope, source):
+        # (value, match) for a stored translation, where match is
+        # {'match': 'exact'|'fuzzy', 'similarity', 'source'}; (None, None) on a miss
+        with self._lock:
+            hit = self._get(self.make_key(scope, source))
+            if hit is not None:
+                self.exact_hits += 1
+                return hit[1], {'match': 'exact', 'similarity': 1.0, 'source': hit[0]}
+            keys, _ = self._load_index(scope)
+        if not keys or self.embed is None:
+            with self._lock:
+                self.misses += 1
+            return None, None
+        query = self._embed_one(normalize_candidate(source))
+        with self._lock:
+            if query is None:
+                self.misses += 1
+                return None, None
+            keys, matrix = self._load_index(scope)
+            if matrix.shape[1] == len(query):
+                scores = matrix @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    hit = self._get(keys[best])
+                    if hit is not None:
+                        self.fuzzy_hits += 1
+                        return (_with_input_text(hit[1], source),
+                                {'match': 'fuzzy', 'similarity': float(scores[best]), 'source': hit[0]})
+            self.misses += 1
+            return None, None
+
+    def store(self, scope, source, value):
+        # Embeds the source (when fuzzy lookup is enabled) so later near matches can find it
+        key = self.make_key(scope, source)
+        vector = self._embed_one(normalize_candidate(source))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, scope, normalize_candidate(source), json.dumps(value, ensure_ascii=False),
+                 self.embed_model, vector.tobytes() if vector is not None else None, time.time()))
+            self._conn.commit()
+            index = self._index.get(scope)
+            if index is not None and vector is not None and key not in index[0]:
+                keys, matrix = index
+                if matrix.size and matrix.shape[1] != len(vector):
+                    return
+                self._index[scope] = (keys + [key], np.vstack([matrix.reshape(-1, len(vector)), vector]))
+
+    def get_stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            lookups = self.exact_hits + self.fuzzy_hits + self.misses
+            return {
+                'entries': entries,
+                'exact_hits': self.exact_hits,
+                'fuzzy_hits': self.fuzzy_hits,
+                'misses': self.misses,
+                'hit_rate': (self.exact_hits + self.fuzzy_hits) / lookups if lookups else 0.0
+            }
+
+    def print_stats(self):
+        s = self.get_stats()
+        print(f"[STATS] translation memory: {s['exact_hits']} exact, {s['fuzzy_hits']} fuzzy, {s['misses']} misses, "
+              f"hit rate {s['hit_rate']:.1%}, {s['entries']} entries")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def open_translation_memory(path=DEFAULT_TM_PATH, threshold=DEFAULT_TM_THRESHOLD, embed=None, embed_model=""):
+    # TranslationMemory for the given path, or None when it is not configured
+    if not path:
+        return None
+    return TranslationMemory(path, threshold=threshold, embed=embed, embed_model=embed_model)